@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for the dashboard (app.py)
+
+Default: 1 sync worker, each request holds the worker until it is done.
+FLASK_ASYNC=1: gevent workers, every connection is a greenlet, so hundreds of idle
+dashboards (and the /stream push endpoint) fit in one worker.
+"""
+import os
+
+ASYNC = os.getenv("FLASK_ASYNC", "0") in ("1", "true", "True", "YES", "yes")
+
+bind = os.getenv("FLASK_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("FLASK_WORKERS", "1"))
+timeout = 30
+accesslog = "-"
+errorlog = "-"
+
+if ASYNC:
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("FLASK_WORKER_CONNECTIONS", "1000"))
+    keepalive = 75
+else:
+    threads = int(os.getenv("FLASK_THREADS", "1"))
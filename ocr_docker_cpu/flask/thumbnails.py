@@ -0,0 +1,113 @@
+"""
+Resized JPEG/WebP versions of captured frames, cached on disk.
+
+Entries are named <idx>_<width>.<fmt> after the codes row they show. Hits
+touch the file's mtime and trimming removes the oldest mtimes first, so the
+directory behaves as an LRU bounded to max_bytes. Used by app.py's /image.
+"""
+import io
+import os
+import threading
+from pathlib import Path
+
+from PIL import Image
+
+# fmt -> (Pillow format, mimetype)
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+# Only these widths are rendered; requests are snapped up to the next one so
+# arbitrary ?w= values cannot blow up the cache.
+THUMB_WIDTHS = tuple(sorted(int(v) for v in os.getenv("THUMB_WIDTHS", "320,640,1280").split(",") if v.strip()))
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "80"))
+TRIM_TO = 0.9  # trim down to this share of max_bytes so every put doesn't evict
+TRIM_EVERY = 100  # puts between directory scans, to catch up with other processes' writes
+
+
+def snap_width(width):
+    """Smallest configured width >= width; the largest for 0 or oversized requests."""
+    for candidate in THUMB_WIDTHS:
+        if width and candidate >= width:
+            return candidate
+    return THUMB_WIDTHS[-1]
+
+
+def resize(source, width):
+    """Decode source scaled down to width (never up) as an RGB image."""
+    with Image.open(source) as img:
+        # JPEG: let the decoder downscale by 1/2, 1/4 or 1/8 instead of decoding full size
+        img.draft("RGB", (width, max(1, img.height * width // img.width)))
+        img = img.convert("RGB")
+
+    if img.width > width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+    return img
+
+
+def encode(img, fmt):
+    buf = io.BytesIO()
+    img.save(buf, FORMATS[fmt][0], quality=THUMB_QUALITY)
+    return buf.getvalue()
+
+
+class ThumbnailCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.total = None  # bytes in the directory as of the last scan, plus our own puts since
+        self.puts = 0
+
+    def path(self, idx, width, fmt):
+        return self.directory / f"{idx}_{width}.{fmt}"
+
+    def get(self, idx, width, fmt):
+        """Path of a cached entry (marked as recently used), or None."""
+        path = self.path(idx, width, fmt)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            pass  # read-only mount: still a hit, just no LRU bump
+        return path
+
+    def put(self, idx, width, fmt, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(idx, width, fmt)
+
+        # several gunicorn workers (and threads) may render the same entry; the last rename wins
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        self.puts += 1
+        if self.total is not None:
+            self.total += len(data)
+        if self.total is None or self.total > self.max_bytes or self.puts % TRIM_EVERY == 0:
+            self.trim()
+        return path
+
+    def trim(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            self.total = total
+            return
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * TRIM_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.total = total
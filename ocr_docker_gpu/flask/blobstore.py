@@ -0,0 +1,45 @@
+"""
+Content-addressed store for captured frames.
+
+Each frame is kept once under <root>/ab/cd/<sha256><ext>, sharded by the first
+hex digits of its hash, so storing the same bytes twice is a no-op and a blob
+name is all that is needed to find the file. The codes row -> blob index is
+the code_images table.
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+CHUNK_SIZE = 1 << 20
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path(self, blob):
+        return self.root / blob[:2] / blob[2:4] / blob
+
+    def put(self, source):
+        """Store the file at source and return its blob name (<sha256><ext>)."""
+        source = Path(source)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        # hash while copying, so the frame is read only once; the decode pool and the
+        # I/O thread may store the same frame at once, so each thread has its own temp file
+        tmp_path = self.root / f".{source.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        digest = hashlib.sha256()
+        with open(source, "rb") as src, open(tmp_path, "wb") as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+
+        blob = digest.hexdigest() + source.suffix.lower()
+        path = self.path(blob)
+        if path.exists():
+            os.remove(tmp_path)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+        return blob
@@ -9,7 +9,7 @@ def send_signal_local():    #same PC
         try:
             client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
             client.connect(SOCKET_PATH)
-            client.sendall(b"IMAGE_READY")
+            client.sendall(b"IMAGE_READY\n")
             client.close()
             print("IMAGE_READY sent")
             return
@@ -18,7 +18,21 @@ def send_signal_local():    #same PC
 
     raise RuntimeError("OCR service not available")
 
+def query_local(command):    #same PC, e.g. "STATUS" or "RELOAD"
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(5)
+    client.connect(SOCKET_PATH)
+    client.sendall(command.encode() + b"\n")  # replies need a complete (newline-ended) message
+    reply = client.recv(1024).decode().strip()
+    client.close()
+    return reply
+
+def service_state():    #diagnostics only: "loading", "warming", "ready", ... or "" if no reply
+    reply = query_local("STATUS")
+    return (reply.split() or [""])[0]
+
 if __name__ == "__main__":
+    # no need to wait for "ready": the service queues triggers while its engines load
     while True:
         send_signal_local()
         time.sleep(20)
@@ -2,10 +2,16 @@
 Unified WSGI Application for PaddleOCR Service
 """
 import os
+import json
+import time
 import sqlite3
+import threading
 from pathlib import Path
 import logging
-from flask import Flask, jsonify, render_template, send_from_directory, abort
+from flask import Flask, Response, jsonify, render_template, send_file, send_from_directory, abort, request
+
+import thumbnails
+from blobstore import BlobStore
 
 logging.basicConfig(
     level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
@@ -21,9 +27,46 @@ BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 DB_FILE = DATA_DIR / "ocr_data.db"
 TEMP_IMAGE_PATH = DATA_DIR / "temp.png"
+SNAPSHOT_FILE = DATA_DIR / "latest.json"
+BLOB_DIR = DATA_DIR / "blobs"  # per-row frames written by ocr.py, see blobstore.py
+THUMB_DIR = DATA_DIR / "thumbs"  # shared with ocr.py, which renders new rows eagerly
+THUMB_CACHE_MB = int(os.getenv("THUMB_CACHE_MB", "256"))
 TEMP_IMAGE_DIR = DATA_DIR
 TEMP_IMAGE_FILENAME = TEMP_IMAGE_PATH.name
 
+# --------------------- Serving Mode ---------------------
+# FLASK_ASYNC=1 runs under gevent workers (see gunicorn.conf.py); only then is
+# /stream enabled, since every open stream would pin a sync worker thread.
+ASYNC_MODE = os.getenv("FLASK_ASYNC", "0") in ("1", "true", "True", "YES", "yes")
+STREAM_INTERVAL = float(os.getenv("STREAM_INTERVAL", "0.5"))  # snapshot check period
+STREAM_HEARTBEAT = 15.0  # seconds between keep-alive comments on an idle stream
+
+# --------------------- Snapshot ---------------------
+# The OCR service rewrites SNAPSHOT_FILE (via os.replace) after every new row,
+# so /data never opens the live database. The file is only re-read when its
+# mtime/size changes.
+snapshot_lock = threading.Lock()
+snapshot_cache = (None, None)  # (stat key, raw JSON bytes)
+
+def read_snapshot():
+    """Return the latest snapshot as raw JSON bytes, or None if none is published."""
+    global snapshot_cache
+
+    try:
+        stat = SNAPSHOT_FILE.stat()
+    except FileNotFoundError:
+        return None
+
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached_key, payload = snapshot_cache
+    if cached_key == key:
+        return payload
+
+    with snapshot_lock:
+        payload = SNAPSHOT_FILE.read_bytes()
+        snapshot_cache = (key, payload)
+    return payload
+
 # --------------------- Database ---------------------
 def fetch_codes(limit: int = 5):
     """Fetch codes from database, returns (data, latest_idx)"""
@@ -47,18 +90,127 @@ def fetch_codes(limit: int = 5):
 
     return data_rows, latest_idx
 
+def fetch_blob(idx):
+    """Stored frame of a codes row (a primary-key lookup), or None."""
+    if not DB_FILE.exists():
+        return None
+
+    try:
+        with sqlite3.connect(f"file:{DB_FILE}?mode=ro", uri=True, timeout=3) as conn:
+            row = conn.execute("SELECT blob FROM code_images WHERE idx = ?", (idx,)).fetchone()
+    except sqlite3.OperationalError:
+        return None  # OCR service not upgraded yet, no code_images table
+
+    if row is None:
+        return None
+    path = blobs.path(row[0])
+    return path if path.exists() else None
+
+def latest_payload():
+    """The /data body: the published snapshot, or built from the database if there is none."""
+    payload = read_snapshot()
+    if payload is None:
+        rows, image_version = fetch_codes()
+        payload = json.dumps({"rows": rows, "image_version": image_version}).encode()
+    return payload
+
+# --------------------- Thumbnails ---------------------
+thumb_cache = thumbnails.ThumbnailCache(THUMB_DIR, THUMB_CACHE_MB * 1024 * 1024)
+blobs = BlobStore(BLOB_DIR)
+
+def frame_source(idx):
+    """The row's stored frame; for rows without one, temp.png if it still shows the latest row."""
+    path = fetch_blob(idx)
+    if path is not None:
+        return path
+
+    payload = read_snapshot()
+    if payload is None or json.loads(payload)["image_version"] != idx:
+        return None
+
+    # the next frame is copied in before its row is published; ctime (copy2
+    # keeps the camera's mtime) tells whether that has happened already
+    try:
+        if TEMP_IMAGE_PATH.stat().st_ctime > SNAPSHOT_FILE.stat().st_mtime:
+            return None
+    except FileNotFoundError:
+        return None
+    return TEMP_IMAGE_PATH
+
 # --------------------- Routes ---------------------
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return render_template("index.html", stream=ASYNC_MODE)
 
 @app.route("/data")
 def data():
-    rows, image_version = fetch_codes()
-    return jsonify({
-        "rows": rows,
-        "image_version": image_version
-    })
+    return Response(latest_payload(), mimetype="application/json")
+
+@app.route("/stream")
+def stream():
+    """Server-sent events: push the /data payload whenever the snapshot changes."""
+    if not ASYNC_MODE:
+        abort(404)
+
+    def events():
+        last = read_snapshot()
+        yield b"data: " + latest_payload() + b"\n\n"
+
+        idle = 0.0
+        while True:
+            # read_snapshot returns the same bytes object until the file changes
+            payload = read_snapshot()
+            if payload is not None and payload is not last:
+                last = payload
+                idle = 0.0
+                yield b"data: " + payload + b"\n\n"
+            elif idle >= STREAM_HEARTBEAT:
+                idle = 0.0
+                yield b": keep-alive\n\n"
+
+            time.sleep(STREAM_INTERVAL)
+            idle += STREAM_INTERVAL
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/history")
+def history():
+    """Older rows come from the full database; the dashboard only polls /data."""
+    limit = min(request.args.get("limit", 100, type=int), 1000)
+    rows, _ = fetch_codes(limit)
+    return jsonify({"rows": rows})
+
+@app.route("/image/<int:idx>")
+def image(idx):
+    """Frame of a codes row, resized: ?w=<px> (snapped to THUMB_WIDTHS) &fmt=webp|jpeg."""
+    width = thumbnails.snap_width(request.args.get("w", 0, type=int))
+    fmt = request.args.get("fmt")
+    if fmt is None:
+        fmt = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+    if fmt not in thumbnails.FORMATS:
+        abort(400)
+
+    path = thumb_cache.get(idx, width, fmt)
+    if path is None:
+        source = frame_source(idx)
+        if source is None:
+            abort(404)
+        path = thumb_cache.put(idx, width, fmt, thumbnails.encode(thumbnails.resize(source, width), fmt))
+
+    # a row's frame never changes, so browsers may keep it for good
+    response = send_file(path, mimetype=thumbnails.FORMATS[fmt][1], max_age=31536000)
+    response.cache_control.immutable = True
+    response.vary.add("Accept")
+    return response
+
+@app.route("/frame/<int:idx>")
+def frame(idx):
+    """Original captured frame of a codes row, for audits."""
+    path = fetch_blob(idx)
+    if path is None:
+        abort(404)
+    return send_file(path, max_age=31536000)
 
 @app.route("/temp.png")
 def serve_temp_image():
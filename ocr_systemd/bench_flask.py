@@ -0,0 +1,296 @@
+"""
+Connection benchmark for the dashboard (app.py) under Gunicorn.
+
+Starts Gunicorn with gunicorn.conf.py once per serving mode (FLASK_ASYNC=0:
+sync/threaded workers, FLASK_ASYNC=1: gevent) and connects N simulated
+dashboards over raw asyncio HTTP/1.1 connections:
+
+  poll    every dashboard fetches /data each --interval s on a keep-alive
+          connection and /temp.png every --image-every polls (what the page
+          does with FLASK_ASYNC=0)
+  stream  every dashboard holds /stream open (what the page does with
+          FLASK_ASYNC=1); only available in the async mode
+
+A separate probe client fetches /data --probe-rate times per second
+throughout, so "probe" latency shows how a new visitor is served while
+N dashboards are connected. "open" is the number of dashboards still
+connected at the end of a run.
+
+    python bench_flask.py --clients 50,200,500 --duration 30
+    python bench_flask.py --modes async --dashboard stream --clients 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJ_DIR = Path(__file__).resolve().parent
+
+
+# --------------------- HTTP Client ---------------------
+class Connection:
+    """One keep-alive HTTP/1.1 connection, reopened when the server closes it."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def send_request(self, path):
+        if self.writer is None:
+            await self.open()
+        request = f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n\r\n"
+        self.writer.write(request.encode())
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip().lower()
+        return status, headers
+
+    async def get(self, path):
+        """GET path and read the whole body; returns (status, body bytes)."""
+        try:
+            try:
+                reused = self.writer is not None
+                status, headers = await self.send_request(path)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # the server closed an idle keep-alive connection; retry once like a browser
+                if not reused:
+                    raise
+                self.close()
+                status, headers = await self.send_request(path)
+            body = b""
+            if "content-length" in headers:
+                body = await self.reader.readexactly(int(headers["content-length"]))
+            elif headers.get("transfer-encoding") == "chunked":
+                while True:
+                    size = int((await self.reader.readline()).split(b";")[0], 16)
+                    chunk = await self.reader.readexactly(size + 2)
+                    if size == 0:
+                        break
+                    body += chunk[:-2]
+            else:
+                body = await self.reader.read()
+                self.close()
+        except BaseException:
+            self.close()
+            raise
+
+        if headers.get("connection") == "close":
+            self.close()
+        return status, body
+
+
+# --------------------- Clients ---------------------
+class Stats:
+    def __init__(self):
+        self.data_ms = []
+        self.probe_ms = []
+        self.image_bytes = 0
+        self.errors = 0
+        self.open = 0
+
+
+async def timed_get(conn, path, timeout):
+    start = time.perf_counter()
+    status, body = await asyncio.wait_for(conn.get(path), timeout)
+    if status != 200:
+        raise RuntimeError(f"{path}: HTTP {status}")
+    return (time.perf_counter() - start) * 1000, body
+
+
+async def poll_dashboard(args, stats, deadline):
+    conn = Connection(args.host, args.port)
+    stats.open += 1
+    polls = 0
+    # spread the first polls over one interval like real page loads
+    await asyncio.sleep(random.uniform(0, args.interval))
+    try:
+        while time.monotonic() < deadline:
+            try:
+                ms, _ = await timed_get(conn, "/data", args.timeout)
+                stats.data_ms.append(ms)
+                polls += 1
+                if args.image_every and polls % args.image_every == 0:
+                    _, body = await timed_get(conn, "/temp.png", args.timeout)
+                    stats.image_bytes += len(body)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, RuntimeError, ValueError):
+                stats.errors += 1
+                conn.close()
+            await asyncio.sleep(args.interval)
+    finally:
+        conn.close()
+        stats.open -= 1
+
+
+async def stream_dashboard(args, stats, deadline):
+    conn = Connection(args.host, args.port)
+    try:
+        start = time.perf_counter()
+        status, _ = await asyncio.wait_for(conn.send_request("/stream"), args.timeout)
+        if status != 200:
+            raise RuntimeError(f"/stream: HTTP {status}")
+        # first event is the current snapshot, sent as soon as the stream opens
+        await asyncio.wait_for(conn.reader.readuntil(b"\n\n"), args.timeout)
+        stats.data_ms.append((time.perf_counter() - start) * 1000)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, RuntimeError, ValueError):
+        stats.errors += 1
+        conn.close()
+        return
+
+    stats.open += 1
+    try:
+        while time.monotonic() < deadline:
+            remaining = deadline - time.monotonic()
+            try:
+                # events and keep-alive comments; EOF means the server dropped us
+                if not await asyncio.wait_for(conn.reader.read(4096), remaining):
+                    stats.errors += 1
+                    return
+            except asyncio.TimeoutError:
+                return
+            except OSError:
+                stats.errors += 1
+                return
+    finally:
+        conn.close()
+        stats.open -= 1
+
+
+async def probe(args, stats, deadline):
+    while time.monotonic() < deadline:
+        conn = Connection(args.host, args.port)
+        try:
+            ms, _ = await timed_get(conn, "/data", args.timeout)
+            stats.probe_ms.append(ms)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, RuntimeError, ValueError):
+            stats.errors += 1
+        finally:
+            conn.close()
+        await asyncio.sleep(1 / args.probe_rate)
+
+
+async def run_clients(args, dashboard, clients):
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+    client = stream_dashboard if dashboard == "stream" else poll_dashboard
+
+    tasks = [asyncio.create_task(client(args, stats, deadline)) for _ in range(clients)]
+    tasks.append(asyncio.create_task(probe(args, stats, deadline)))
+    # count dashboards that are still connected just before the end
+    await asyncio.sleep(max(0.0, args.duration - 1))
+    still_open = stats.open
+    await asyncio.gather(*tasks)
+    stats.open = still_open
+    return stats
+
+
+# --------------------- Server ---------------------
+def wait_for_port(host, port, timeout=20):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def start_server(args, mode):
+    env = dict(os.environ, FLASK_ASYNC="1" if mode == "async" else "0")
+    cmd = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py",
+           "--bind", f"{args.host}:{args.port}", "--log-level", "warning", "app:app"]
+    server = subprocess.Popen(cmd, cwd=args.app_dir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for_port(args.host, args.port):
+        server.kill()
+        raise SystemExit(f"gunicorn ({mode}) did not start on {args.host}:{args.port}")
+    return server
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=35)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+# --------------------- Report ---------------------
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(mode, dashboard, clients, stats, duration):
+    line = f"{mode:>6}{dashboard:>8}{clients:>8}{stats.open:>6}{len(stats.data_ms):>8}{stats.errors:>7}"
+    for values in (stats.data_ms, stats.probe_ms):
+        if values:
+            line += f"{statistics.median(values):>9.1f}{percentile(values, 95):>9.1f}{percentile(values, 99):>9.1f}"
+        else:
+            line += f"{'-':>9}{'-':>9}{'-':>9}"
+    line += f"{stats.image_bytes / duration / 1e6:>10.1f}"
+    print(line, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=str(PROJ_DIR), help="directory with app.py and gunicorn.conf.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--modes", default="sync,async", help="serving modes to compare: sync, async")
+    parser.add_argument("--dashboard", choices=("auto", "poll", "stream"), default="auto",
+                        help="dashboard behaviour; auto = what the page does in each mode")
+    parser.add_argument("--clients", default="50,200,500", help="comma-separated concurrent dashboards")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per run")
+    parser.add_argument("--interval", type=float, default=2.0, help="poll: seconds between /data requests")
+    parser.add_argument("--image-every", type=int, default=5, help="poll: fetch /temp.png every N polls, 0 = never")
+    parser.add_argument("--probe-rate", type=float, default=5, help="probe /data requests per second")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds before a request counts as an error")
+    args = parser.parse_args()
+
+    print(f"{args.duration:.0f} s per run; latencies in ms")
+    print(f"{'mode':>6}{'dash':>8}{'clients':>8}{'open':>6}{'reqs':>8}{'errors':>7}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}{'probe50':>9}{'probe95':>9}{'probe99':>9}{'img MB/s':>10}")
+
+    for mode in args.modes.split(","):
+        dashboard = args.dashboard
+        if dashboard == "auto":
+            dashboard = "stream" if mode == "async" else "poll"
+        if dashboard == "stream" and mode != "async":
+            print(f"{mode:>6}  skipped: /stream needs the async mode")
+            continue
+
+        server = start_server(args, mode)
+        try:
+            for clients in (int(c) for c in args.clients.split(",")):
+                stats = asyncio.run(run_clients(args, dashboard, clients))
+                report(mode, dashboard, clients, stats, args.duration)
+        finally:
+            stop_server(server)
+
+
+if __name__ == "__main__":
+    main()
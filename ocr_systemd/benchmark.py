@@ -0,0 +1,123 @@
+"""
+Inference benchmark for every deployment (systemd, CPU and GPU containers).
+
+Times the service's own OCR path (ocr_read, with adaptive det/cls if
+enabled) over sample images, with the engine built from the same
+environment the service reads: backend, device, model dir, CPU profile.
+--sweep tries OCR_CPU_AFFINITY x cpu_threads x mkldnn instead and prints
+the best CPU profile for this host. The affinity candidates are all cores
+and the first N (powers of two); in the service the remaining cores decode,
+which this only times inference for, so prefer fewer cores when it is close.
+
+    python benchmark.py --images image_folder
+    python benchmark.py --images image_folder --sweep
+    docker compose run --rm ocr_service python3 ocr_service.py --benchmark --sweep
+"""
+import argparse
+import os
+import statistics
+import time
+from pathlib import Path
+
+import ocr as service
+
+
+def run(images, frames, rounds):
+    """Seconds per image for each of rounds passes over the frames."""
+    service.ocr_read(frames[0], service.camera_id(images[0]))  # warm-up
+
+    latencies = []
+    for _ in range(rounds):
+        for image, frame in zip(images, frames):
+            start = time.perf_counter()
+            service.ocr_read(frame, service.camera_id(image))
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(label, latencies):
+    mean = statistics.mean(latencies)
+    print(f"{label:<36}{statistics.median(latencies) * 1000:>10.1f}{mean * 1000:>10.1f}{1 / mean:>10.2f}", flush=True)
+    return mean
+
+
+def cpu_list(cores):
+    """Format core ids as a cpuset string such as "0-3,6" (what ocr.parse_cpu_list reads)."""
+    ranges = []
+    for core in sorted(cores):
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ",".join(f"{first}-{last}" if first != last else str(first) for first, last in ranges)
+
+
+def affinity_candidates():
+    """OCR_CPU_AFFINITY values to try: all cores ("") and the first 1, 2, 4, ... of them."""
+    cores = sorted(os.sched_getaffinity(0))
+    candidates = [""]
+    count = 1
+    while count < len(cores):
+        candidates.append(cpu_list(cores[:count]))
+        count *= 2
+    return candidates
+
+
+def sweep(images, frames, rounds):
+    results = []
+    for affinity in affinity_candidates():
+        service.OCR_CPU_AFFINITY = affinity
+        cores = len(service.inference_cores() or os.sched_getaffinity(0))
+        thread_counts = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+
+        for mkldnn in (False, True):
+            for threads in thread_counts:
+                service.OCR_CPU_THREADS, service.OCR_ENABLE_MKLDNN = threads, mkldnn
+                # inference runs like in a worker: on the inference cores, with the engine built there
+                with service.inference_affinity():
+                    service.ocr = service.build_ocr()
+                    label = f"cores={affinity or 'all'} cpu_threads={threads} mkldnn={int(mkldnn)}"
+                    mean = report(label, run(images, frames, rounds))
+                results.append((mean, affinity, threads, mkldnn))
+
+    mean, affinity, threads, mkldnn = min(results)
+    print("\nBest on this host:")
+    print(f"  OCR_CPU_AFFINITY={affinity}" + ("" if affinity else "   (all cores)"))
+    print(f"  OCR_CPU_THREADS={threads}")
+    print(f"  OCR_ENABLE_MKLDNN={int(mkldnn)}")
+    print(f"  -> {mean * 1000:.1f} ms/image, {1 / mean:.2f} images/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=str(service.IMG_DIR))
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the images per setting")
+    parser.add_argument("--sweep", action="store_true",
+                        help="try cpu affinity x cpu_threads x mkldnn (paddle backend on CPU)")
+    args = parser.parse_args(argv)
+    if args.sweep and service.OCR_BACKEND != "paddle":
+        parser.error("--sweep tunes Paddle Inference, set OCR_BACKEND=paddle")
+
+    images = sorted(
+        p for p in Path(args.images).iterdir()
+        if p.name.lower().endswith(service.IMAGE_EXTS)
+    )
+    loaded = [(image, service.load_frame(image)) for image in images]
+    loaded = [(image, frame) for image, frame in loaded if frame is not None]
+    if not loaded:
+        raise SystemExit(f"no readable images in {args.images}")
+    images, frames = zip(*loaded)
+
+    print(f"{len(images)} images x {args.rounds} rounds, {service.OCR_BACKEND} backend, device {service.OCR_DEVICE}")
+    print(f"{'setting':<36}{'p50 ms':>10}{'mean ms':>10}{'images/s':>10}")
+    if args.sweep:
+        sweep(images, frames, args.rounds)
+    else:
+        # inference runs like in a worker: on the inference cores, with the engine built there
+        service.pin_current_thread(service.inference_cores())
+        service.ocr = service.build_ocr()
+        report("configured", run(images, frames, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Accuracy vs latency comparison of OCR inference backends.
+
+Runs every backend over the same sample images with the service's own
+extraction code and reports latency next to how often the codes agree
+with the first (reference) backend.
+
+A backend can also be a named variant, name=backend[:model_dir[:precision]],
+to compare models or precisions of one backend; the parts left out keep
+the environment's OCR_MODEL_DIR / OCR_ONNX_DIR and OCR_PRECISION.
+
+    python compare_backends.py --images image_folder --backends paddle,onnx
+    python compare_backends.py --backends fp32=paddle,int8=paddle:paddle_models/slim_int8:int8,onnx
+"""
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+import ocr as service
+
+MODEL_DIR, ONNX_DIR, PRECISION = service.OCR_MODEL_DIR, service.OCR_ONNX_DIR, service.OCR_PRECISION
+
+
+def parse_variant(spec):
+    """'name=backend[:model_dir[:precision]]' or a bare backend -> (name, backend, model_dir, precision)."""
+    name, sep, definition = spec.partition("=")
+    if not sep:
+        name, definition = spec, spec
+    backend, model_dir, precision = (definition.split(":", 2) + ["", ""])[:3]
+    return name, backend, model_dir, precision
+
+
+def run_backend(backend, model_dir, precision, images, rounds):
+    # build_ocr reads these from the service module; unset parts keep the environment's values
+    service.OCR_MODEL_DIR = model_dir if model_dir and backend != "onnx" else MODEL_DIR
+    service.OCR_ONNX_DIR = Path(model_dir) if model_dir and backend == "onnx" else ONNX_DIR
+    service.OCR_PRECISION = precision or PRECISION
+    service.ocr = service.build_ocr(backend)
+    service.ocr_read(str(images[0]), service.camera_id(images[0]))  # warm-up
+
+    codes, latencies = {}, []
+    for _ in range(rounds):
+        for image in images:
+            start = time.perf_counter()
+            codes[image.name] = service.ocr_read(str(image), service.camera_id(image))
+            latencies.append(time.perf_counter() - start)
+
+    return codes, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=str(service.PROJ_DIR / "image_folder"))
+    parser.add_argument("--backends", default="paddle,onnx",
+                        help="comma-separated backends or name=backend[:model_dir[:precision]] variants, "
+                             "the first one is the reference")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    images = sorted(
+        p for p in Path(args.images).iterdir()
+        if p.name.lower().endswith(service.IMAGE_EXTS)
+    )
+    variants = [parse_variant(b.strip()) for b in args.backends.split(",") if b.strip()]
+    backends = [name for name, *_ in variants]
+    if len(set(backends)) < len(backends):
+        parser.error("--backends: every variant needs its own name")
+
+    results = {}
+    for name, backend, model_dir, precision in variants:
+        print(f"Running {name} ({backend} backend, {model_dir or 'default models'}, "
+              f"{precision or PRECISION}) on {len(images)} images x {args.rounds} rounds...")
+        results[name] = run_backend(backend, model_dir, precision, images, args.rounds)
+
+    reference, (ref_codes, ref_latencies) = backends[0], results[backends[0]]
+    ref_p50 = statistics.median(ref_latencies)
+
+    width = max(10, max(len(backend) for backend in backends) + 2)
+    print(f"\n{'backend':<{width}}{'p50 ms':>10}{'mean ms':>10}{'speedup':>10}{'agree':>10}")
+    for backend in backends:
+        codes, latencies = results[backend]
+        p50 = statistics.median(latencies)
+        agree = sum(codes[name] == ref_codes[name] for name in ref_codes)
+        print(f"{backend:<{width}}{p50 * 1000:>10.1f}{statistics.mean(latencies) * 1000:>10.1f}"
+              f"{ref_p50 / p50:>9.2f}x{agree:>6}/{len(ref_codes)}")
+
+    for backend in backends[1:]:
+        codes = results[backend][0]
+        for name in sorted(ref_codes):
+            if codes[name] != ref_codes[name]:
+                print(f"  {backend} differs on {name}: {codes[name]} vs {reference} {ref_codes[name]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+#!/usr/bin/env bash
+# Export the Paddle Inference models in paddle_models/{det,rec,cls} to ONNX
+# for the onnx backend (OCR_BACKEND=onnx).
+#
+# Requires: pip install paddle2onnx onnxruntime
+set -e
+
+cd "$(dirname "$0")"
+
+MODEL_DIR="${OCR_MODEL_DIR:-paddle_models}"
+ONNX_DIR="${OCR_ONNX_DIR:-paddle_models/onnx}"
+
+mkdir -p "$ONNX_DIR"
+
+for model in det rec cls; do
+    echo "Converting $MODEL_DIR/$model -> $ONNX_DIR/$model.onnx"
+    paddle2onnx \
+        --model_dir "$MODEL_DIR/$model" \
+        --model_filename inference.pdmodel \
+        --params_filename inference.pdiparams \
+        --save_file "$ONNX_DIR/$model.onnx" \
+        --opset_version 11 \
+        --enable_onnx_checker True
+done
+
+echo "Done. Compare with: python compare_backends.py --backends paddle,onnx"
@@ -0,0 +1,75 @@
+"""
+Frame readiness: tell a completely written camera frame from one still being written.
+
+A frame is complete when
+  * a JPEG ends with the EOI marker (FF D9), a PNG with its IEND chunk; only
+    the first and last few bytes are read, nothing is decoded
+  * or, for files with no recognisable header, its size and mtime have not
+    changed for `settle` seconds
+A JPEG/PNG that stops growing without its end marker is truncated and never
+admitted. Verdicts are cached by (size, mtime), so rechecking a frame that
+has not changed costs one stat.
+"""
+import os
+import time
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"IEND\xaeB`\x82"  # chunk type + CRC, always the same bytes
+TAIL_BYTES = 4096  # room for zero padding after EOI
+MAX_ENTRIES = 1024
+
+
+def has_end_marker(path, size):
+    """True/False for JPEG and PNG files, None if the format has no marker to check."""
+    with open(path, "rb") as f:
+        head = f.read(len(PNG_SIGNATURE))
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read(TAIL_BYTES)
+
+    if head.startswith(JPEG_SOI):
+        # some cameras pad the file with zeros after EOI
+        return tail.rstrip(b"\0").endswith(JPEG_EOI)
+    if head == PNG_SIGNATURE:
+        return PNG_IEND in tail
+    return None
+
+
+class FrameGate:
+    def __init__(self, settle):
+        self.settle = settle
+        self.seen = {}  # path -> ((size, mtime_ns), first seen with that key, verdict)
+
+    def ready(self, path):
+        """True once the frame at path is completely written."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+
+        key = (st.st_size, st.st_mtime_ns)
+        entry = self.seen.get(path)
+        if entry is None or entry[0] != key:
+            try:
+                complete = has_end_marker(path, st.st_size) if st.st_size else False
+            except OSError:
+                complete = False
+            if len(self.seen) >= MAX_ENTRIES:
+                self.seen.clear()
+            entry = self.seen[path] = (key, time.monotonic(), complete)
+
+        _, since, complete = entry
+        if complete is None:
+            return time.monotonic() - since >= self.settle
+        return complete
+
+    def wait(self, paths, timeout, poll=0.02):
+        """Split paths into (complete, incomplete), waiting up to timeout seconds for all of them."""
+        deadline = time.monotonic() + timeout
+        while True:
+            pending = [path for path in paths if not self.ready(path)]
+            if not pending or time.monotonic() >= deadline:
+                break
+            time.sleep(poll)
+        return [path for path in paths if path not in pending], pending
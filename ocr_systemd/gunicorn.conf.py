@@ -0,0 +1,21 @@
+"""
+Gunicorn settings for the dashboard (app.py)
+
+Default: 2 sync workers x 2 threads, each request holds a thread until it is done.
+FLASK_ASYNC=1: gevent workers, every connection is a greenlet, so hundreds of idle
+dashboards (and the /stream push endpoint) fit in one worker.
+"""
+import os
+
+ASYNC = os.getenv("FLASK_ASYNC", "0") in ("1", "true", "True", "YES", "yes")
+
+bind = os.getenv("FLASK_BIND", "127.0.0.1:8000")
+workers = int(os.getenv("FLASK_WORKERS", "2"))
+timeout = 30
+
+if ASYNC:
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("FLASK_WORKER_CONNECTIONS", "1000"))
+    keepalive = 75
+else:
+    threads = int(os.getenv("FLASK_THREADS", "2"))
@@ -0,0 +1,103 @@
+"""
+Latency and read-rate report from the OCR service's jobs table.
+
+Every job the service runs is stored with its trigger time, queue wait,
+busy time, per-stage timings and outcome (see JobTrace in ocr.py). This
+groups them by hour and/or lane and prints percentiles of the trigger to
+result latency (queue + busy), so a slow hour or a slow lane shows up
+without reading logs.
+
+    python job_report.py --by hour --since "2024-05-01"
+    python job_report.py --by lane --slowest 10
+"""
+import argparse
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+
+DEFAULT_DB = Path(os.getenv("DB_FILE", Path(__file__).resolve().parent / "data/ocr_data.db"))
+KEYS = {
+    "hour": lambda row: row["trigger_time"][:13] + ":00",
+    "lane": lambda row: row["lane"],
+}
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+def load(db, since):
+    conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute(
+            "SELECT * FROM jobs WHERE trigger_time >= ? ORDER BY trigger_time", (since,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+# --------------------- Reports ---------------------
+def report(rows, by):
+    keys = [KEYS[name] for name in by]
+    groups = defaultdict(list)
+    for row in rows:
+        groups[tuple(key(row) for key in keys)].append(row)
+
+    stages = sorted({stage for row in rows for stage in json.loads(row["detail"])["stages"]})
+    label = ",".join(by)
+    print(f"{label:<28}{'jobs':>6}{'read %':>8}{'merged':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'busy p95':>10}{'queue p95':>10}" + "".join(f"{stage:>13}" for stage in stages))
+
+    for group, jobs in sorted(groups.items()):
+        latency = sorted(row["queue_ms"] + row["busy_ms"] for row in jobs)
+        busy = sorted(row["busy_ms"] for row in jobs)
+        waited = sorted(row["queue_ms"] for row in jobs)
+        read = sum(row["outcome"] == "read" for row in jobs)
+        merged = sum(row["triggers"] - 1 for row in jobs)
+
+        totals = defaultdict(float)
+        for row in jobs:
+            for stage, ms in json.loads(row["detail"])["stages"].items():
+                totals[stage] += ms
+
+        print(f"{','.join(group):<28}{len(jobs):>6}{100 * read / len(jobs):>8.1f}{merged:>8}"
+              f"{percentile(latency, 0.5):>9.0f}{percentile(latency, 0.95):>9.0f}{percentile(latency, 0.99):>9.0f}"
+              f"{percentile(busy, 0.95):>10.0f}{percentile(waited, 0.95):>10.0f}"
+              + "".join(f"{totals[stage] / len(jobs):>13.1f}" for stage in stages))
+    if stages:
+        print("\nstage columns are mean ms per job")
+
+
+def slowest(rows, count):
+    print(f"\n{'trigger time':<25}{'lane':<10}{'queue ms':>9}{'busy ms':>9}  {'outcome':<9}stages")
+    for row in sorted(rows, key=lambda row: -(row["queue_ms"] + row["busy_ms"]))[:count]:
+        detail = json.loads(row["detail"])
+        stages = " ".join(f"{stage}={ms:.0f}" for stage, ms in sorted(detail["stages"].items(), key=lambda s: -s[1]))
+        print(f"{row['trigger_time']:<25}{row['lane']:<10}{row['queue_ms']:>9.0f}{row['busy_ms']:>9.0f}  "
+              f"{row['outcome']:<9}{stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=str(DEFAULT_DB))
+    parser.add_argument("--by", default="hour", type=lambda s: s.split(","),
+                        help="group by hour, lane or hour,lane")
+    parser.add_argument("--since", default="", help='only jobs triggered at or after this time, e.g. "2024-05-01 08"')
+    parser.add_argument("--slowest", type=int, default=0, help="also list the N slowest jobs")
+    args = parser.parse_args()
+    if not set(args.by) <= set(KEYS):
+        parser.error(f"--by takes {', '.join(KEYS)}")
+
+    rows = load(args.db, args.since)
+    if not rows:
+        raise SystemExit("no jobs recorded")
+    report(rows, args.by)
+    if args.slowest:
+        slowest(rows, args.slowest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Replay load generator for the OCR service.
+
+Copies frames from a sample folder into a scratch IMG_DIR as simulated
+trucks, fires IMAGE_READY triggers over the Unix or TCP socket following an
+arrival process, and measures trigger-to-result latency by watching the
+`codes` table (and retake replies on the result socket). Run the service
+with IMG_DIR pointing at the same scratch folder.
+
+Results are matched to triggers from the jobs table, which records how
+many triggers each job merged (OCR_TRIGGER_DEBOUNCE_MS): the oldest one
+gets the latency sample, the rest count as "merged". On databases without
+it, every `codes` row and retake answers the oldest trigger of its lane.
+"lost" counts triggers that were neither answered nor merged before the
+drain timeout (dropped by a full lane queue, or still queued). "queue ms"
+is the mean server-side queue wait taken from lane_metrics.
+
+    # service
+    IMG_DIR=/tmp/ocr_load python ocr.py
+    # generator: step through arrival rates to find the saturation point
+    python load_generator.py --img-dir /tmp/ocr_load --arrival poisson --rates 6,12,24,48 --duration 120
+"""
+import argparse
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+PROJ_DIR = Path(__file__).resolve().parent
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg')
+KEEP_FRAMES = 40  # scratch frames kept per lane, older ones are pruned
+RETAKE_OUTCOMES = ("failed", "unusable", "missing")  # jobs that reply with a retake
+
+
+# --------------------- Arrival Processes ---------------------
+def arrival_times(kind, rate_per_min, duration, burst_every, burst_len, burst_factor):
+    """Yield trigger offsets in seconds from the start of a run."""
+    rate = rate_per_min / 60.0
+    t = 0.0
+    while True:
+        if kind == "constant":
+            t += 1.0 / rate
+        elif kind == "poisson":
+            t += random.expovariate(rate)
+        elif kind == "bursty":
+            # shift change: burst_factor x the base rate for burst_len seconds every burst_every seconds
+            in_burst = (t % burst_every) < burst_len
+            t += random.expovariate(rate * burst_factor if in_burst else rate)
+        else:
+            raise ValueError(f"unknown arrival process {kind!r}")
+
+        if t >= duration:
+            return
+        yield t
+
+
+# --------------------- Frames ---------------------
+def load_cameras(frames_dir):
+    """Sample frames grouped by camera ('Top_3.jpeg' -> 'Top'), so each truck gets one frame per camera."""
+    cameras = defaultdict(list)
+    for path in sorted(Path(frames_dir).iterdir()):
+        if path.name.lower().endswith(IMAGE_EXTS):
+            cameras[path.stem.rsplit("_", 1)[0]].append(path)
+    if not cameras:
+        raise SystemExit(f"No frames found in {frames_dir}")
+    return cameras
+
+
+def frame_target(img_dir, lane_source, lane, name):
+    if lane_source == "subdir":
+        return Path(img_dir) / lane / name
+    if lane_source == "prefix":
+        return Path(img_dir) / f"{lane}__{name}"
+    return Path(img_dir) / name
+
+
+def write_truck(cameras, truck, img_dir, lane_source, lane, written):
+    """Copy one frame per camera into IMG_DIR, atomically and with a fresh mtime."""
+    for camera, frames in cameras.items():
+        src = frames[truck % len(frames)]
+        dst = frame_target(img_dir, lane_source, lane, f"{camera}_{truck}{src.suffix}")
+        dst.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = dst.with_name(f".{dst.name}.tmp")
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+        os.utime(dst)
+
+        written[lane].append(dst)
+        while len(written[lane]) > KEEP_FRAMES:
+            old = written[lane].popleft()
+            if old.exists():
+                old.unlink()
+
+
+# --------------------- Transport ---------------------
+def send_trigger(args, message):
+    if args.tcp:
+        host, port = args.tcp.rsplit(":", 1)
+        client = socket.create_connection((host, int(port)), timeout=2)
+    else:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(2)
+        client.connect(args.socket)
+    with client:
+        client.sendall(message.encode())
+
+
+class ReplyListener(threading.Thread):
+    """Receives retake replies on the result socket in place of the downstream system."""
+
+    def __init__(self, path, on_retake):
+        super().__init__(daemon=True)
+        self.path = path
+        self.on_retake = on_retake
+        if os.path.exists(path):
+            os.remove(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(16)
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn:
+                msg = conn.recv(1024).decode().strip()
+            if msg.startswith("retake images"):
+                parts = msg.split()
+                self.on_retake(parts[2] if len(parts) > 2 else "default")
+
+
+# --------------------- Measurement ---------------------
+class ResultWatcher(threading.Thread):
+    """Matches finished jobs (or `codes` rows and retakes) to outstanding triggers, FIFO per lane."""
+
+    def __init__(self, db_file, poll):
+        super().__init__(daemon=True)
+        self.db_file = db_file
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.pending = defaultdict(deque)  # lane -> trigger times
+        self.latencies = []
+        self.retakes = 0
+        self.merged = 0
+        self.stopped = threading.Event()
+        self.has_jobs = bool(self.query("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'jobs'"))
+        if self.has_jobs:
+            self.last_id = self.query("SELECT COALESCE(MAX(id), 0) FROM jobs")[0][0]
+        else:
+            self.last_id = self.query("SELECT COALESCE(MAX(idx), 0) FROM codes")[0][0]
+
+    def query(self, sql, params=()):
+        with sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True, timeout=3) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def triggered(self, lane):
+        with self.lock:
+            self.pending[lane].append(time.perf_counter())
+
+    def answered(self, lane, retake=False, triggers=1):
+        """A job finished: its first trigger gets a latency sample, the ones merged into it are resolved."""
+        now = time.perf_counter()
+        with self.lock:
+            pending = self.pending[lane]
+            if not pending:
+                return
+            self.latencies.append(now - pending.popleft())
+            self.retakes += retake
+            for _ in range(min(triggers - 1, len(pending))):
+                pending.popleft()
+                self.merged += 1
+
+    def retake(self, lane):
+        if not self.has_jobs:  # otherwise the job's row answers it
+            self.answered(lane, retake=True)
+
+    def outstanding(self):
+        with self.lock:
+            return sum(len(q) for q in self.pending.values())
+
+    def run(self):
+        if self.has_jobs:
+            sql = "SELECT id, lane, triggers, outcome FROM jobs WHERE id > ? ORDER BY id"
+        else:
+            has_lane = any(row[1] == "lane" for row in self.query("PRAGMA table_info(codes)"))
+            sql = f"SELECT idx, {'lane' if has_lane else repr('default')}, 1, 'read' FROM codes WHERE idx > ? ORDER BY idx"
+        while not self.stopped.is_set():
+            try:
+                rows = self.query(sql, (self.last_id,))
+            except sqlite3.OperationalError:
+                rows = []  # writer holds the lock, try again next poll
+            for row_id, lane, triggers, outcome in rows:
+                self.last_id = row_id
+                self.answered(lane, retake=outcome in RETAKE_OUTCOMES, triggers=triggers)
+            time.sleep(self.poll)
+
+
+def lane_queue_totals(db_file):
+    """(jobs, queue_ms) summed over lane_metrics, or None on databases without it."""
+    try:
+        with sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, timeout=3) as conn:
+            return conn.execute("SELECT COALESCE(SUM(jobs), 0), COALESCE(SUM(queue_ms), 0) FROM lane_metrics").fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+# --------------------- Runs ---------------------
+def run_rate(args, cameras, rate, truck_counter, written):
+    watcher = ResultWatcher(args.db, args.poll)
+    watcher.start()
+    listener = ReplyListener(args.reply_socket, watcher.retake) if args.reply_socket else None
+    if listener:
+        listener.start()
+    queue_before = lane_queue_totals(args.db)
+
+    lanes = args.lanes.split(",") if args.lanes else ["default"]
+    start = time.perf_counter()
+    sent = 0
+    for offset in arrival_times(args.arrival, rate, args.duration, args.burst_every, args.burst_len, args.burst_factor):
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        lane = random.choice(lanes)
+        write_truck(cameras, next(truck_counter), args.img_dir, args.lane_source, lane, written)
+        message = "IMAGE_READY" if lane == "default" else f"IMAGE_READY {lane}"
+        try:
+            send_trigger(args, message)
+        except OSError as e:
+            print(f"  trigger failed: {e}")
+            continue
+        watcher.triggered(lane)
+        sent += 1
+
+    # let the service drain what is still queued
+    deadline = time.perf_counter() + args.drain
+    while watcher.outstanding() and time.perf_counter() < deadline:
+        time.sleep(args.poll)
+    elapsed = time.perf_counter() - start
+
+    watcher.stopped.set()
+    if listener:
+        listener.server.close()
+        os.remove(args.reply_socket)
+
+    queue_after = lane_queue_totals(args.db)
+    queue_ms = None
+    if queue_before and queue_after and queue_after[0] > queue_before[0]:
+        queue_ms = (queue_after[1] - queue_before[1]) / (queue_after[0] - queue_before[0])
+
+    return dict(
+        rate=rate, sent=sent, done=len(watcher.latencies), retakes=watcher.retakes,
+        merged=watcher.merged, lost=watcher.outstanding(), throughput=len(watcher.latencies) / elapsed * 60,
+        latencies=watcher.latencies, queue_ms=queue_ms,
+    )
+
+
+def report(result):
+    lat = result["latencies"]
+    line = (f"{result['rate']:>8.1f}{result['sent']:>7}{result['done']:>7}{result['retakes']:>8}{result['merged']:>8}"
+            f"{result['lost']:>6}"
+            f"{result['throughput']:>10.1f}")
+    if lat:
+        line += (f"{statistics.median(lat) * 1000:>9.0f}{percentile(lat, 95) * 1000:>9.0f}"
+                 f"{percentile(lat, 99) * 1000:>9.0f}")
+    else:
+        line += f"{'-':>9}{'-':>9}{'-':>9}"
+    line += f"{result['queue_ms']:>10.0f}" if result["queue_ms"] is not None else f"{'-':>10}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", default=str(PROJ_DIR / "image_folder"), help="sample frames to replay")
+    parser.add_argument("--img-dir", required=True, help="scratch IMG_DIR the service is watching")
+    parser.add_argument("--db", default=os.getenv("DB_FILE", str(PROJ_DIR / "data/ocr_data.db")))
+    parser.add_argument("--socket", default=os.getenv("IPC_SOCKET_PATH", "/home/zzq/ocr_tmp/ipc_image.sock"))
+    parser.add_argument("--tcp", help="host:port of a TCP trigger listener instead of the Unix socket")
+    parser.add_argument("--reply-socket", help="listen here for retake replies (the service's IPC_RESULT_SOCKET_PATH)")
+    parser.add_argument("--lanes", help="comma-separated lanes to spread trucks over")
+    parser.add_argument("--lane-source", choices=("none", "subdir", "prefix"), default="none",
+                        help="frame layout, must match the service's OCR_LANE_SOURCE")
+    parser.add_argument("--arrival", choices=("constant", "poisson", "bursty"), default="poisson")
+    parser.add_argument("--rates", default="6", help="comma-separated arrival rates in trucks/min, run in order")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of arrivals per rate")
+    parser.add_argument("--drain", type=float, default=30, help="seconds to wait for outstanding results")
+    parser.add_argument("--burst-every", type=float, default=60, help="bursty: seconds between shift changes")
+    parser.add_argument("--burst-len", type=float, default=10, help="bursty: length of a shift change in seconds")
+    parser.add_argument("--burst-factor", type=float, default=5, help="bursty: rate multiplier during a shift change")
+    parser.add_argument("--poll", type=float, default=0.05, help="DB poll interval in seconds")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.lanes and args.lane_source == "none":
+        parser.error("--lanes needs --lane-source subdir or prefix")
+    random.seed(args.seed)
+
+    cameras = load_cameras(args.frames)
+    Path(args.img_dir).mkdir(parents=True, exist_ok=True)
+    truck_counter = iter(range(10**9))
+    written = defaultdict(deque)
+
+    print(f"{args.arrival} arrivals, {args.duration:.0f} s per rate, cameras: {', '.join(cameras)}")
+    print(f"{'rate/min':>8}{'sent':>7}{'done':>7}{'retakes':>8}{'merged':>8}{'lost':>6}{'done/min':>10}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queue ms':>10}")
+
+    results = []
+    for rate in (float(r) for r in args.rates.split(",")):
+        result = run_rate(args, cameras, rate, truck_counter, written)
+        report(result)
+        results.append(result)
+
+    # saturation: highest completion rate reached while still keeping up with the offered load
+    keeping_up = [r for r in results if r["sent"] and r["done"] + r["merged"] >= 0.95 * r["sent"]]
+    best = max(results, key=lambda r: r["throughput"])
+    print(f"\nPeak throughput: {best['throughput']:.1f} trucks/min at {best['rate']:.1f}/min offered")
+    if keeping_up:
+        print(f"Highest rate fully served: {max(r['rate'] for r in keeping_up):.1f} trucks/min")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Memory accounting for the long-running OCR process.
+
+  rss_mb()    resident set size, from /proc/self/statm (one small read)
+  peak_mb()   highest RSS since start (getrusage)
+  heap()      glibc malloc's view: bytes in use vs. held free in its arenas,
+              which is where a fragmented heap shows up as RSS that is never
+              given back
+  trim()      malloc_trim(0): hand the free arena pages back to the kernel
+  limit_mb()  the cgroup's hard memory limit (systemd MemoryMax, docker --memory)
+Everything degrades to None/False where glibc or /proc are missing.
+"""
+import ctypes
+import ctypes.util
+import os
+import resource
+
+MB = 1024 * 1024
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in (
+        "arena", "ordblks", "smblks", "hblks", "hblkhd", "usmblks",
+        "fsmblks", "uordblks", "fordblks", "keepcost",
+    )]
+
+
+def load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+        libc.malloc_trim.argtypes = [ctypes.c_size_t]
+        libc.malloc_trim.restype = ctypes.c_int
+    except (OSError, AttributeError):
+        return None, None
+
+    try:
+        libc.mallinfo2.restype = MallInfo2  # glibc 2.33+
+        return libc, libc.mallinfo2
+    except AttributeError:
+        return libc, None
+
+
+libc, mallinfo2 = load_libc()
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / MB
+    except (OSError, IndexError, ValueError):
+        return peak_mb()
+
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def heap():
+    """{"in_use_mb", "free_mb", "mmap_mb"} from mallinfo2, or None."""
+    if mallinfo2 is None:
+        return None
+    info = mallinfo2()
+    return {
+        "in_use_mb": round(info.uordblks / MB, 1),
+        "free_mb": round(info.fordblks / MB, 1),
+        "mmap_mb": round(info.hblkhd / MB, 1),
+    }
+
+
+def trim():
+    """Return free malloc memory to the kernel; True if anything was released."""
+    return bool(libc.malloc_trim(0)) if libc is not None else False
+
+
+def limit_mb():
+    """memory.max of this process's cgroup (v2), or None when unlimited or unknown."""
+    try:
+        with open("/proc/self/cgroup") as f:
+            path = next(line[3:].strip() for line in f if line.startswith("0::"))  # "0::/system.slice/ocr.service"
+        with open(f"/sys/fs/cgroup{path}/memory.max") as f:
+            value = f.read().strip()
+    except (OSError, StopIteration):
+        return None
+    return int(value) / MB if value.isdigit() else None
@@ -7,7 +7,10 @@
 import os
 import re
 import time
+STARTED = time.monotonic()  # startup metrics are measured from here
 import shutil
+import json
+import gc
 from pathlib import Path
 import sqlite3
 from datetime import datetime
@@ -15,8 +18,25 @@ from PIL import Image, ImageEnhance
 import logging
 import socket
 import signal
-    
-from paddleocr import PaddleOCR
+import sys
+import threading
+import queue
+import select
+import selectors
+import itertools
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+import memory
+import quality
+import thumbnails
+import transport
+from blobstore import BlobStore
+from frames import FrameGate
+from profiling import Profiler
 
 # --------------------- Paths ---------------------
 # DATA_DIR = Path("/home/zzq/ocr_systemd/data")
@@ -26,14 +46,163 @@ from paddleocr import PaddleOCR
 
 #project path
 PROJ_DIR = Path(__file__).resolve().parent
-DB_FILE = PROJ_DIR / "data/ocr_data.db"
-TEMP_IMAGE_PATH = PROJ_DIR / "data/temp.png"
+DB_FILE = Path(os.getenv("DB_FILE", PROJ_DIR / "data/ocr_data.db"))
+TEMP_IMAGE_PATH = Path(os.getenv("TEMP_IMAGE_PATH", PROJ_DIR / "data/temp.png"))
 
-#change the path manually
-IMG_DIR = Path("/home/zzq/image_folder")
+#change the path manually (or override with the environment, e.g. for load tests)
+IMG_DIR = Path(os.getenv("IMG_DIR", "/home/zzq/image_folder"))
 # Unix domain socket path for IPC
-SOCKET_PATH = "/home/zzq/ocr_tmp/ipc_image.sock"  #receive from IPC
-SOCKET_PATH2 = "/home/zzq/ocr_tmp/ocr_result.sock" #send to IPC
+SOCKET_PATH = os.getenv("IPC_SOCKET_PATH", "/home/zzq/ocr_tmp/ipc_image.sock")  #receive from IPC
+# Messages end with a newline or when the client closes. A connection that
+# sits on an unterminated message for IPC_READ_TIMEOUT seconds has it handled
+# as complete (old senders omit the newline) and is then closed.
+IPC_READ_TIMEOUT = float(os.getenv("IPC_READ_TIMEOUT", "2.0"))
+IPC_MAX_MESSAGE = 1024
+IPC_MAX_CONNECTIONS = int(os.getenv("IPC_MAX_CONNECTIONS", "512"))  # oldest idle peer evicted beyond this
+SOCKET_PATH2 = os.getenv("IPC_RESULT_SOCKET_PATH", "/home/zzq/ocr_tmp/ocr_result.sock") #send to IPC
+# Transport of both: unix:<path> or tcp:<host>:<port> (see transport.py), the
+# Unix sockets above unless set. The containers listen on tcp:0.0.0.0:6000.
+IPC_LISTEN = transport.parse(os.getenv("IPC_LISTEN", SOCKET_PATH))
+IPC_REPLY = transport.parse(os.getenv("IPC_REPLY", SOCKET_PATH2))
+
+# Latest-state snapshot for the dashboard, replaced atomically after every write
+SNAPSHOT_FILE = Path(os.getenv("SNAPSHOT_FILE", DB_FILE.parent / "latest.json"))
+SNAPSHOT_ROWS = int(os.getenv("SNAPSHOT_ROWS", "5"))
+
+# Every row's frame, content-addressed (see blobstore.py); indexed by code_images
+BLOB_DIR = Path(os.getenv("BLOB_DIR", DB_FILE.parent / "blobs"))
+
+# Resized frames for the dashboard's /image endpoint, shared with app.py.
+# THUMB_EAGER_WIDTHS are rendered (WebP and JPEG) as soon as a row is written.
+THUMB_DIR = Path(os.getenv("THUMB_DIR", DB_FILE.parent / "thumbs"))
+THUMB_CACHE_MB = int(os.getenv("THUMB_CACHE_MB", "256"))
+THUMB_EAGER_WIDTHS = [thumbnails.snap_width(int(v)) for v in os.getenv("THUMB_EAGER_WIDTHS", "640").split(",") if v.strip()]
+
+# Profiles taken on demand (PROFILE on the trigger socket or SIGUSR1), see profiling.py
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", DB_FILE.parent / "profiles"))
+PROFILE_JOBS = int(os.getenv("PROFILE_JOBS", "20"))  # jobs per session unless PROFILE names a count
+
+# Every job's timings and raw OCR output go to the jobs table (see JobTrace, job_report.py)
+JOBS_KEEP_DAYS = int(os.getenv("OCR_JOBS_KEEP_DAYS", "30"))  # 0 = keep forever
+JOBS_PRUNE_EVERY = 1000
+
+# --------------------- Memory ---------------------
+# RSS and malloc heap stats are sampled after every job (STATUS, jobs table),
+# after free heap pages are handed back to the kernel (OCR_MEMORY_TRIM).
+# Above OCR_MEMORY_SOFT_LIMIT_MB the engines are recycled between jobs like
+# a RELOAD: a fresh set is built and warmed up while the current one keeps
+# serving, so leave room below the unit's MemoryMax for one more set. At
+# most once per OCR_MEMORY_RECYCLE_JOBS jobs, in case the growth is not in
+# the engines; if RSS is still above the limit after a recycle, recycling
+# stops until restart. OCR_GPU_MEMORY_MB caps Paddle's GPU memory pool. Limits of 0 are off.
+MEMORY_SOFT_LIMIT_MB = float(os.getenv("OCR_MEMORY_SOFT_LIMIT_MB", "0"))
+MEMORY_RECYCLE_JOBS = int(os.getenv("OCR_MEMORY_RECYCLE_JOBS", "50"))
+MEMORY_TRIM = os.getenv("OCR_MEMORY_TRIM", "1") in ("1", "true", "True", "YES", "yes")
+GPU_MEMORY_MB = int(os.getenv("OCR_GPU_MEMORY_MB", "0"))
+
+# --------------------- Lanes ---------------------
+# OCR_LANE_SOURCE decides how frames in IMG_DIR are grouped into lanes:
+#   none   - a single lane over the whole folder
+#   subdir - IMG_DIR/<lane>/<frame>
+#   prefix - IMG_DIR/<lane><OCR_LANE_SEPARATOR><frame>, e.g. "lane1__Top_3.jpeg"
+# Triggers name their lane ("IMAGE_READY lane1"); a bare IMAGE_READY goes to
+# the lane with the newest frame.
+LANE_SOURCE = os.getenv("OCR_LANE_SOURCE", "none")
+LANE_SEPARATOR = os.getenv("OCR_LANE_SEPARATOR", "__")
+LANE_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+DEFAULT_LANE = "default"
+LANE_QUEUE_SIZE = int(os.getenv("OCR_LANE_QUEUE_SIZE", "4"))  # pending jobs per lane
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "1"))              # engines serving all lanes
+
+# Cameras and PLCs often fire several IMAGE_READY for one truck. A lane's job
+# starts only after OCR_TRIGGER_DEBOUNCE_MS without a new trigger or frame;
+# triggers arriving before then are merged into it. OCR_TRIGGER_DEBOUNCE_MAX_MS
+# caps the wait from the first trigger. 0 disables merging.
+TRIGGER_DEBOUNCE = float(os.getenv("OCR_TRIGGER_DEBOUNCE_MS", "300")) / 1000
+TRIGGER_DEBOUNCE_MAX = float(os.getenv("OCR_TRIGGER_DEBOUNCE_MAX_MS", "2000")) / 1000
+
+# --------------------- Frames ---------------------
+# A frame the camera is still writing is waited for (up to OCR_FRAME_WAIT_MS)
+# instead of being OCRed truncated; see frames.py. Files without a JPEG/PNG
+# end marker count as complete once unchanged for OCR_FRAME_SETTLE_MS.
+FRAME_WAIT = float(os.getenv("OCR_FRAME_WAIT_MS", "2000")) / 1000
+FRAME_SETTLE = float(os.getenv("OCR_FRAME_SETTLE_MS", "500")) / 1000
+# Newest frames a job reads from its lane, and how many of them must exist or
+# the job is a retake (the deployments set both, see their ocr_service.py)
+FRAMES_PER_JOB = int(os.getenv("OCR_FRAMES_PER_JOB", "2"))
+MIN_FRAMES = int(os.getenv("OCR_MIN_FRAMES", "2"))
+
+# --------------------- Quality Gate ---------------------
+# Frames are scored for blur and exposure on a small greyscale copy before
+# OCR (see quality.py). Unusable ones are not OCRed, only the sharpest
+# OCR_QUALITY_TOP_K per camera are (0 = all usable ones), and a job with no
+# usable frame asks for a retake right away. The thresholds are tune_quality.py's
+# suggestion for the sample images (see README); those score 62.9-322 sharpness
+# untouched, so the gate only rejects degraded frames. Off by default: tune it
+# on the site's own frames, then enable it with OCR_QUALITY_GATE=1.
+QUALITY_GATE = os.getenv("OCR_QUALITY_GATE", "0") in ("1", "true", "True", "YES", "yes")
+QUALITY_MIN_SHARPNESS = float(os.getenv("OCR_QUALITY_MIN_SHARPNESS", "4"))
+QUALITY_MAX_CLIPPED = float(os.getenv("OCR_QUALITY_MAX_CLIPPED", "0.54"))
+QUALITY_TOP_K = int(os.getenv("OCR_QUALITY_TOP_K", "0"))
+
+# --------------------- Pipeline ---------------------
+# Each job runs as decode -> inference -> I/O. Frames are decoded on a
+# separate pool while the worker infers, and DB writes and the temp image
+# copy go to an I/O thread behind a bounded queue. IPC replies go to the
+# notifier thread below.
+OCR_DECODE_WORKERS = int(os.getenv("OCR_DECODE_WORKERS", "2"))
+OCR_IO_QUEUE_SIZE = int(os.getenv("OCR_IO_QUEUE_SIZE", "16"))
+
+# --------------------- Speculative Enhancement ---------------------
+# A frame whose raw pass finds no code is OCRed again with contrast
+# enhancement. With OCR_SPECULATE=1 the enhanced pass of a frame likely to
+# need it is offered to the idle OCR workers when the raw pass starts, and
+# cancelled, or its result discarded, if the raw pass reads a code. Likely
+# means the camera's first raw pass was weak (no code, or a mean score below
+# OCR_MIN_SCORE) on at least OCR_SPECULATE_RATE of its recent frames, or, with
+# a site-tuned OCR_SPECULATE_SHARPNESS, a frame scored below it by the quality
+# gate (0 = off: the sample frames score 62.9+ and still fail, see tune_quality.py).
+# Busy workers never take it, so under load frames are enhanced one after the
+# other as before. Needs OCR_WORKERS > 1, with cores for both (OCR_CPU_THREADS).
+SPECULATE = os.getenv("OCR_SPECULATE", "0") in ("1", "true", "True", "YES", "yes")
+SPECULATE_SHARPNESS = float(os.getenv("OCR_SPECULATE_SHARPNESS", "0"))
+SPECULATE_RATE = float(os.getenv("OCR_SPECULATE_RATE", "0.1"))
+SPECULATE_HISTORY = int(os.getenv("OCR_SPECULATE_HISTORY", "50"))  # first raw passes remembered per camera
+
+# --------------------- Notifications ---------------------
+# Messages to IPC_REPLY are sent by a notifier thread, never by
+# the OCR path. While the receiver is down they are spilled to NOTIFY_OUTBOX
+# (one file per message) and replayed in order, with exponential backoff
+# between attempts. NOTIFY_PERSISTENT=1 keeps one connection open and ends
+# every message with a newline; the receiver must then split on newlines.
+NOTIFY_OUTBOX = Path(os.getenv("NOTIFY_OUTBOX", DB_FILE.parent / "outbox"))
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "100"))          # backlog in memory before the notifier spills it
+NOTIFY_OUTBOX_MAX = int(os.getenv("NOTIFY_OUTBOX_MAX", "1000"))         # oldest spilled messages dropped beyond this
+NOTIFY_CONNECT_TIMEOUT = float(os.getenv("NOTIFY_CONNECT_TIMEOUT", "1.0"))
+NOTIFY_SEND_TIMEOUT = float(os.getenv("NOTIFY_SEND_TIMEOUT", "2.0"))
+NOTIFY_MAX_BACKOFF = float(os.getenv("NOTIFY_MAX_BACKOFF", "10"))
+NOTIFY_PERSISTENT = os.getenv("NOTIFY_PERSISTENT", "0") in ("1", "true", "True", "YES", "yes")
+
+# --------------------- Inference Backend ---------------------
+# OCR_BACKEND selects how the det/rec/cls models are executed:
+#   paddle - Paddle Inference models in OCR_MODEL_DIR/{det,rec,cls}; point
+#            OCR_MODEL_DIR at a slim/INT8 export to run quantized models
+#   onnx   - ONNX Runtime (CPU) with OCR_ONNX_DIR/{det,rec,cls}.onnx,
+#            produced from the Paddle models by convert_onnx.sh
+OCR_BACKEND = os.getenv("OCR_BACKEND", "paddle")
+# empty = PaddleOCR's own models, downloaded to ~/.paddleocr on first start (containers)
+OCR_MODEL_DIR = os.getenv("OCR_MODEL_DIR", str(PROJ_DIR / "paddle_models"))
+OCR_ONNX_DIR = Path(os.getenv("OCR_ONNX_DIR", PROJ_DIR / "paddle_models/onnx"))
+OCR_PRECISION = os.getenv("OCR_PRECISION", "fp32")  # fp16/int8 run through TensorRT on GPU
+OCR_DEVICE = os.getenv("OCR_DEVICE", "auto")  # cpu/gpu; auto = GPU if Paddle was built with CUDA
+# CPU profile, tuned per host with benchmark.py --sweep. The OCR workers are
+# pinned to OCR_CPU_AFFINITY (e.g. "0-3") and Paddle's threads inherit that
+# mask; decoding and preprocessing run on the remaining cores.
+OCR_CPU_THREADS = int(os.getenv("OCR_CPU_THREADS", "0"))  # 0 = Paddle default
+OCR_ENABLE_MKLDNN = os.getenv("OCR_ENABLE_MKLDNN", "0") in ("1", "true", "True", "YES", "yes")
+OCR_CPU_AFFINITY = os.getenv("OCR_CPU_AFFINITY", "")
+# Extra PaddleOCR arguments as JSON (e.g. {"det_db_thresh": 0.3}), re-read on every reload
+OCR_PARAMS_FILE = Path(os.getenv("OCR_PARAMS_FILE", PROJ_DIR / "ocr_params.json"))
 
 # --------------------- Config ---------------------
 IMAGE_EXTS = ('.png', '.jpg', '.jpeg')
@@ -41,90 +210,779 @@ CAR_PREFIX = ('XD', 'XE', 'XF')
 CAR_NUM_PATTERN = re.compile(r'^(\d{4}[A-Z]$|\d{3}[A-Z]$|\d{3}$)')
 CONTAINER_PATTERN = re.compile(r'^([A-Z]{4}|\d{6})')
 
+# Mean line score a pass needs, on top of a matched code, to count as a
+# confident read in the adaptive modes below.
+OCR_MIN_SCORE = float(os.getenv("OCR_MIN_SCORE", "0.85"))
+
+# Adaptive detection resolution: frames are detected at the smallest
+# det_limit_side_len first and only escalated when no confident code is found.
+DET_ADAPTIVE = os.getenv("OCR_DET_ADAPTIVE", "0") in ("1", "true", "True", "YES", "yes")
+DET_LIMITS = tuple(sorted(int(v) for v in os.getenv("OCR_DET_LIMITS", "480,736,960").split(",") if v.strip()))
+DET_HISTORY = int(os.getenv("OCR_DET_HISTORY", "20"))       # wins remembered per camera
+DET_PROBE_EVERY = int(os.getenv("OCR_DET_PROBE_EVERY", "10"))  # retry the lowest limit every N frames
+
+# Adaptive angle classifier: the first pass skips cls and only unconfident
+# frames are retried with it. Cameras whose frames keep needing the retry
+# get cls on the first pass until probes show it is no longer needed.
+CLS_ADAPTIVE = os.getenv("OCR_CLS_ADAPTIVE", "0") in ("1", "true", "True", "YES", "yes")
+CLS_ENABLE_RATE = float(os.getenv("OCR_CLS_ENABLE_RATE", "0.2"))  # share of recent frames that needed cls
+CLS_HISTORY = int(os.getenv("OCR_CLS_HISTORY", "50"))
+CLS_PROBE_EVERY = int(os.getenv("OCR_CLS_PROBE_EVERY", "10"))     # try without cls every N frames
+
 # PaddleOCR
 ocr = None
 RUNNING = True
 
-logging.basicConfig(
-    level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    force=True  # optional, ensures config is applied even if logger already exists
-)
-logging.getLogger("ppocr").setLevel(logging.ERROR)
+# One engine per OCR worker. A reload swaps in a whole new list; each worker
+# picks up engines[index] at the start of its next job (see engine()).
+engines = []
+engine_generation = 0
+service_state = "loading"  # loading -> warming -> ready <-> reloading, answered to STATUS
+reload_lock = threading.Lock()
+engines_ready = threading.Event()  # workers hold queued jobs until set
+startup = {}                       # seconds from STARTED to accept / ready, for STATUS
+exit_code = 0
+worker = threading.local()
+scheduler = None
+decode_pool = None
+io_queue = queue.Queue(maxsize=OCR_IO_QUEUE_SIZE)
+notifier = None
+recent_rows = deque(maxlen=SNAPSHOT_ROWS)  # only touched by the I/O stage once running
+thumb_cache = thumbnails.ThumbnailCache(THUMB_DIR, THUMB_CACHE_MB * 1024 * 1024)
+profiler = Profiler(PROFILE_DIR)
+blobs = BlobStore(BLOB_DIR)
+jobs_recorded = 0  # only touched by the I/O stage
+memory_lock = threading.Lock()
+jobs_since_recycle = 0
+recycles = 0
+recycle_swapped = False  # a recycle's engines are in; the first sample without old engines tells if it helped
+engine_users = Counter()  # engine generation -> jobs and side tasks holding one of its engines
+engine_set_mb = None  # RSS one set of engines added at startup
+recycle_rss = None  # RSS after the last recycle
+recycling_stopped = False
+frame_gate = FrameGate(FRAME_SETTLE)
+
+# Adaptive detection state, keyed by camera id
+det_limit_wins = defaultdict(lambda: deque(maxlen=DET_HISTORY))
+det_frame_count = Counter()
+
+# Adaptive classifier state, keyed by camera id
+cls_needed = defaultdict(lambda: deque(maxlen=CLS_HISTORY))
+cls_frame_count = Counter()
+cls_cameras = set()
+
+# Whether the raw pass found nothing, per camera, for OCR_SPECULATE
+raw_weak = defaultdict(lambda: deque(maxlen=SPECULATE_HISTORY))  # camera -> first raw pass found no confident code
+
+def configure_logging():
+    # importing paddleocr resets the root and "ppocr" levels, so this runs again after it
+    logging.basicConfig(
+        level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        force=True  # optional, ensures config is applied even if logger already exists
+    )
+    logging.getLogger("ppocr").setLevel(logging.ERROR)
+
+configure_logging()
 
 def shutdown_handler(*_):
     global RUNNING
     logging.info("Shutdown signal received, exiting OCR service...")
     RUNNING = False
 
-signal.signal(signal.SIGTERM, shutdown_handler)
-signal.signal(signal.SIGINT, shutdown_handler)
+def reload_handler(*_):
+    logging.info("SIGHUP received, reloading OCR engines...")
+    request_reload()
+
+def profile_handler(*_):
+    # a second SIGUSR1 ends the session early
+    if not profiler.start(jobs=PROFILE_JOBS):
+        profiler.stop()
+
+def install_signal_handlers():
+    signal.signal(signal.SIGTERM, shutdown_handler)
+    signal.signal(signal.SIGINT, shutdown_handler)
+    signal.signal(signal.SIGHUP, reload_handler)
+    signal.signal(signal.SIGUSR1, profile_handler)
+
+# Installed by main() (and reprocess.py), not on import: the other tools that
+# import this module never look at RUNNING, so Ctrl-C must stay KeyboardInterrupt.
+# Importing Paddle replaces the SIGTERM handler with its own fatal-signal dump.
+# Paddle is imported on the loader thread, but handlers can only be set from
+# the main thread: main() blocks the shutdown signals in every thread until
+# then, and the IPC loop puts our handlers back and unblocks them once this is
+# set, so a stop during the import is still handled by shutdown_handler.
+SHUTDOWN_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+signal_handlers_stale = threading.Event()
 
 # --------------------- Database ---------------------
-def record_to_db(timestamp, car_code, container_code, match_status):
+def init_db():
+    """Add the lane column, lane_metrics and code_images tables to an existing database."""
+    with sqlite3.connect(DB_FILE) as conn:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(codes)")]
+        if "lane" not in columns:
+            conn.execute(f"ALTER TABLE codes ADD COLUMN lane TEXT NOT NULL DEFAULT '{DEFAULT_LANE}'")
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS lane_metrics (
+                lane TEXT PRIMARY KEY,
+                jobs INTEGER NOT NULL,
+                reads INTEGER NOT NULL,
+                retakes INTEGER NOT NULL,
+                busy_ms REAL NOT NULL,
+                queue_ms REAL NOT NULL,
+                max_queue_ms REAL NOT NULL,
+                coalesced INTEGER NOT NULL DEFAULT 0,
+                updated TEXT NOT NULL
+            )
+        """)
+        metric_columns = [row[1] for row in conn.execute("PRAGMA table_info(lane_metrics)")]
+        if "coalesced" not in metric_columns:
+            conn.execute("ALTER TABLE lane_metrics ADD COLUMN coalesced INTEGER NOT NULL DEFAULT 0")
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS code_images (
+                idx INTEGER PRIMARY KEY REFERENCES codes(idx),
+                blob TEXT NOT NULL
+            )
+        """)
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                lane TEXT NOT NULL,
+                trigger_time TEXT NOT NULL,
+                triggers INTEGER NOT NULL,
+                queue_ms REAL NOT NULL,
+                busy_ms REAL NOT NULL,
+                frames INTEGER NOT NULL,
+                ocr_frames INTEGER NOT NULL,
+                enhanced INTEGER NOT NULL,
+                outcome TEXT NOT NULL,
+                code_idx INTEGER REFERENCES codes(idx),
+                detail TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_trigger_time ON jobs (trigger_time)")
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS startups (
+                started TEXT NOT NULL,
+                accept_ms REAL NOT NULL,
+                ready_ms REAL NOT NULL,
+                backend TEXT NOT NULL,
+                engines INTEGER NOT NULL
+            )
+        """)
+    prune_jobs()
+
+def record_to_db(timestamp, car_code, container_code, match_status, lane=DEFAULT_LANE, blob=None):
     query = """
-            INSERT INTO codes (timestamp, car_code, container_code, match_status)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO codes (timestamp, car_code, container_code, match_status, lane)
+            VALUES (?, ?, ?, ?, ?)
         """
 
     with sqlite3.connect(DB_FILE) as conn:
-        conn.execute(query, (
+        cursor = conn.execute(query, (
             timestamp,
             car_code,
             container_code,
-            match_status
+            match_status,
+            lane
+        ))
+        if blob:
+            conn.execute("INSERT INTO code_images (idx, blob) VALUES (?, ?)", (cursor.lastrowid, blob))
+    return cursor.lastrowid
+
+def record_lane_metrics(lane, read_ok, busy_ms, queue_ms, coalesced=0):
+    query = """
+            INSERT INTO lane_metrics (lane, jobs, reads, retakes, busy_ms, queue_ms, max_queue_ms, coalesced, updated)
+            VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(lane) DO UPDATE SET
+                jobs = jobs + 1,
+                reads = reads + excluded.reads,
+                retakes = retakes + excluded.retakes,
+                busy_ms = busy_ms + excluded.busy_ms,
+                queue_ms = queue_ms + excluded.queue_ms,
+                max_queue_ms = MAX(max_queue_ms, excluded.max_queue_ms),
+                coalesced = coalesced + excluded.coalesced,
+                updated = excluded.updated
+        """
+
+    with sqlite3.connect(DB_FILE) as conn:
+        conn.execute(query, (
+            lane,
+            int(read_ok),
+            int(not read_ok),
+            busy_ms,
+            queue_ms,
+            queue_ms,
+            coalesced,
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ))
+
+def record_job(trace, queue_ms, busy_ms):
+    global jobs_recorded
+
+    frames = trace.frames.values()
+    detail = {
+        "stages": {stage: round(ms, 1) for stage, ms in trace.stages.items()},
+        "frames": trace.frames,
+        "memory": trace.memory,
+    }
+    query = """
+            INSERT INTO jobs (lane, trigger_time, triggers, queue_ms, busy_ms, frames, ocr_frames, enhanced,
+                              outcome, code_idx, detail)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+
+    with sqlite3.connect(DB_FILE) as conn:
+        conn.execute(query, (
+            trace.lane,
+            datetime.fromtimestamp(trace.trigger_time).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            trace.triggers,
+            queue_ms,
+            busy_ms,
+            len(frames),
+            sum("ocr_ms" in frame for frame in frames),
+            sum("enhance_ms" in frame for frame in frames),
+            trace.outcome,
+            trace.code_idx,
+            json.dumps(detail, separators=(",", ":"))
+        ))
+
+    jobs_recorded += 1
+    if jobs_recorded % JOBS_PRUNE_EVERY == 0:
+        prune_jobs()
+
+def record_startup(accept_s, ready_s):
+    started = datetime.now().timestamp() - (time.monotonic() - STARTED)
+    with sqlite3.connect(DB_FILE) as conn:
+        conn.execute("INSERT INTO startups (started, accept_ms, ready_ms, backend, engines) VALUES (?, ?, ?, ?, ?)", (
+            datetime.fromtimestamp(started).strftime("%Y-%m-%d %H:%M:%S"),
+            accept_s * 1000,
+            ready_s * 1000,
+            OCR_BACKEND,
+            len(engines)
         ))
 
+def prune_jobs():
+    if not JOBS_KEEP_DAYS:
+        return
+    with sqlite3.connect(DB_FILE) as conn:
+        conn.execute("DELETE FROM jobs WHERE trigger_time < datetime('now', 'localtime', ?)",
+                     (f"-{JOBS_KEEP_DAYS} days",))
+
+# --------------------- Snapshot ---------------------
+def load_recent_rows():
+    """Seed the snapshot with the newest rows already in the database."""
+    query = """
+            SELECT idx, timestamp, car_code, container_code, match_status
+            FROM codes
+            ORDER BY idx DESC
+            LIMIT ?
+        """
+
+    with sqlite3.connect(DB_FILE) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(query, (SNAPSHOT_ROWS,)).fetchall()
+
+    recent_rows.clear()
+    recent_rows.extend(dict(row) for row in reversed(rows))
+    publish_snapshot()
+
+def publish_snapshot():
+    """Write rows + image_version (the /data payload) and swap it in with os.replace."""
+    snapshot = {
+        "rows": list(recent_rows),
+        "image_version": recent_rows[-1]["idx"] if recent_rows else 0
+    }
+
+    tmp_path = SNAPSHOT_FILE.with_name(SNAPSHOT_FILE.name + ".tmp")
+    tmp_path.write_text(json.dumps(snapshot))
+    os.replace(tmp_path, SNAPSHOT_FILE)
+
 # --------------------- IPC Handling ---------------------
 def start_ipc_server():
-    # Local Unix socket client
-    os.makedirs(os.path.dirname(SOCKET_PATH), exist_ok=True)
-    
-    # Remove stale socket if exists. This is important, otherwise bind() will fail next time.
-    if os.path.exists(SOCKET_PATH):
-        os.remove(SOCKET_PATH)
-
-    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    server.bind(SOCKET_PATH)
-    server.listen(5)
-    server.settimeout(1.0)
-    os.chmod(SOCKET_PATH, 0o666)  # allows all users R/W
-    
-    logging.info("IPC Unix socket listening at %s", SOCKET_PATH)
+    server = transport.listen(IPC_LISTEN)
+    startup["accept"] = time.monotonic() - STARTED
+    logging.info("IPC listening at %s, %.2f s after start", transport.describe(IPC_LISTEN), startup["accept"])
     return server
 
 def send_signal_to_ipc(message: str):
-    for _ in range(50):  # retry for ~5 seconds
+    """Hand a message for the result socket to the notifier; never blocks."""
+    notifier.send(message)
+
+class Notifier:
+    """Delivers messages to IPC_REPLY from its own thread (see NOTIFY_* above)."""
+
+    def __init__(self, address, outbox):
+        self.address = address
+        self.outbox = Path(outbox)
+        self.queue = queue.Queue()  # unbounded, so send() never waits; the thread spills a long backlog
+        self.conn = None
+        self.backoff = 0.0
+        self.retry_at = 0.0
+        self.seq = itertools.count()
+        self.thread = threading.Thread(target=self.run, name="notifier", daemon=True)
+
+    def start(self):
+        self.outbox.mkdir(parents=True, exist_ok=True)
+        pending = len(self.spilled())
+        if pending:
+            logging.info("Notifier: %d messages waiting in %s", pending, self.outbox)
+        self.thread.start()
+
+    def send(self, message):
+        # stamped now, so a message spilled later still sorts into the outbox in send order
+        self.queue.put_nowait((time.time_ns(), next(self.seq), message))
+
+    def close(self, timeout=5):
+        """Stop after trying what is queued; undelivered messages stay in the outbox."""
+        self.queue.put_nowait(None)
+        self.thread.join(timeout=timeout)
+        if self.thread.is_alive():
+            # stuck delivering: leave the queued messages on disk for the next start
+            self.drain()
+        self.disconnect()
+
+    # ---- thread ----
+    def run(self):
+        while True:
+            # with a backlog on disk, wake up to retry even when nothing new arrives
+            wait = max(0.1, self.retry_at - time.monotonic()) if self.spilled() else None
+            try:
+                item = self.queue.get(timeout=wait)
+            except queue.Empty:
+                item = ()
+
+            if item is None:
+                self.drain()
+                return
+
+            if item and (self.spilled() or self.queue.qsize() >= NOTIFY_QUEUE_SIZE):
+                self.spill(item)  # keep the order behind older messages; a long backlog waits on disk
+            elif item:
+                if time.monotonic() < self.retry_at or not self.deliver(item[-1]):
+                    self.spill(item)
+                continue
+
+            if time.monotonic() >= self.retry_at:
+                self.replay()
+
+    def replay(self):
+        for path in self.spilled():
+            try:
+                message = path.read_text()
+            except FileNotFoundError:
+                continue
+            if not self.deliver(message):
+                return
+            path.unlink(missing_ok=True)
+        logging.info("Notifier: outbox delivered")
+
+    def deliver(self, message):
+        data = message.encode() + (b"\n" if NOTIFY_PERSISTENT else b"")
+        try:
+            if self.conn is not None and self.peer_closed():
+                self.disconnect()
+            if self.conn is None:
+                self.conn = transport.connect(self.address, NOTIFY_CONNECT_TIMEOUT)
+                self.conn.settimeout(NOTIFY_SEND_TIMEOUT)
+            self.conn.sendall(data)
+        except OSError as e:
+            self.disconnect()
+            self.backoff = min(max(0.1, self.backoff * 2), NOTIFY_MAX_BACKOFF)
+            self.retry_at = time.monotonic() + self.backoff
+            logging.warning("IPC result socket unavailable (%s), retrying in %.1f s", e, self.backoff)
+            return False
+
+        if not NOTIFY_PERSISTENT:
+            self.disconnect()
+        self.backoff = 0.0
+        logging.info("IPC message sent: %s", message)
+        return True
+
+    def peer_closed(self):
+        # a receiver that went away only shows up on the second send, so check first
+        readable, _, _ = select.select([self.conn], [], [], 0)
+        return bool(readable) and not self.conn.recv(1, socket.MSG_PEEK)
+
+    def disconnect(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    # ---- outbox ----
+    def spilled(self):
+        return sorted(self.outbox.glob("*.msg"))
+
+    def drain(self):
+        """Spill everything queued, oldest first."""
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                self.spill(item)
+
+    def spill(self, item):
+        stamp, seq, message = item
+        path = self.outbox / f"{stamp:020d}-{seq:06d}.msg"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(message)
+        os.replace(tmp_path, path)
+
+        spilled = self.spilled()
+        for old in spilled[:max(0, len(spilled) - NOTIFY_OUTBOX_MAX)]:
+            logging.warning("Notifier outbox full, dropping %s", old.name)
+            old.unlink(missing_ok=True)
+
+class IpcPeer:
+    __slots__ = ("buf", "deadline")
+
+    def __init__(self):
+        self.buf = b""
+        self.deadline = time.monotonic() + IPC_READ_TIMEOUT
+
+def serve_ipc(server):
+    """Multiplex the trigger socket with a selector until shutdown.
+
+    Nothing here blocks on a single client: a peer that connects and stalls
+    (or trickles bytes) only occupies a buffer until its deadline. Whatever it
+    has buffered by then is handled as one message, the way the old one-recv
+    listener read senders that never send a newline.
+    """
+    sel = selectors.DefaultSelector()
+    sel.register(server, selectors.EVENT_READ)
+    peers = {}
+    next_sweep = 0.0
+
+    while RUNNING:
+        for key, _ in sel.select(timeout=0.2):
+            if key.fileobj is server:
+                accept_peers(sel, server, peers)
+            else:
+                read_peer(sel, key.fileobj, peers)
+
+        now = time.monotonic()
+        if now >= next_sweep:
+            next_sweep = now + 0.1
+            if signal_handlers_stale.is_set():
+                signal_handlers_stale.clear()
+                install_signal_handlers()
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, SHUTDOWN_SIGNALS)
+            for conn, peer in list(peers.items()):
+                if now > peer.deadline:
+                    if peer.buf.strip():
+                        logging.warning("IPC: message %r has no trailing newline; handling it at the "
+                                        "deadline (deprecated, end messages with \\n)", peer.buf[:64])
+                        message, peer.buf = peer.buf, b""
+                        if not handle_peer_message(sel, conn, peers, message):
+                            continue
+                    close_peer(sel, conn, peers)
+
+    for conn in list(peers):
+        close_peer(sel, conn, peers)
+    sel.close()
+
+def accept_peers(sel, server, peers):
+    while True:
         try:
-            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-            client.connect(SOCKET_PATH2)
-            client.sendall(message.encode())
-            client.close()
-            print("IPC_RESULTsent")
+            conn, _ = server.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+
+        if len(peers) >= IPC_MAX_CONNECTIONS:
+            oldest = min(peers, key=lambda c: peers[c].deadline)
+            logging.warning("IPC: %d open connections, closing the oldest", len(peers))
+            close_peer(sel, oldest, peers)
+
+        conn.setblocking(False)
+        peers[conn] = IpcPeer()
+        sel.register(conn, selectors.EVENT_READ)
+
+def read_peer(sel, conn, peers):
+    peer = peers[conn]
+    try:
+        data = conn.recv(4096)
+    except (BlockingIOError, InterruptedError):
+        return
+    except OSError:
+        close_peer(sel, conn, peers)
+        return
+
+    if data:
+        *messages, peer.buf = (peer.buf + data).split(b"\n")
+    else:
+        messages, peer.buf = [peer.buf], b""  # EOF ends the last message
+
+    for raw in messages:
+        if not handle_peer_message(sel, conn, peers, raw):
             return
-        except ConnectionRefusedError:
-            time.sleep(0.1)
 
-    raise RuntimeError("IPC_RESULT service not available")
+    if not data:
+        close_peer(sel, conn, peers)
+    elif len(peer.buf) > IPC_MAX_MESSAGE:
+        logging.warning("IPC: message over %d bytes, closing connection", IPC_MAX_MESSAGE)
+        close_peer(sel, conn, peers)
+
+def handle_peer_message(sel, conn, peers, raw):
+    """Handle one raw message; False if the peer was closed on the way."""
+    msg = raw.decode(errors="replace").strip()
+    if not msg:
+        return True
+    logging.info("IPC message received: %s", msg)
+    peers[conn].deadline = time.monotonic() + IPC_READ_TIMEOUT
+    try:
+        handle_message(conn, msg)
+    except OSError:
+        close_peer(sel, conn, peers)  # replies are tiny; a full send buffer means a dead peer
+        return False
+    except Exception:
+        logging.exception("IPC message %r failed", msg)
+    return True
+
+def close_peer(sel, conn, peers):
+    sel.unregister(conn)
+    del peers[conn]
+    conn.close()
 
 # --------------------- OCR Processing ---------------------
+def paddle_backend_params():
+    params = {}
+    if OCR_MODEL_DIR:
+        params.update(
+            det_model_dir=str(Path(OCR_MODEL_DIR) / "det"),
+            rec_model_dir=str(Path(OCR_MODEL_DIR) / "rec"),
+            cls_model_dir=str(Path(OCR_MODEL_DIR) / "cls"),
+        )
+    if OCR_DEVICE != "auto":
+        params.update(use_gpu=OCR_DEVICE == "gpu")
+    if OCR_CPU_THREADS:
+        params.update(cpu_threads=OCR_CPU_THREADS)
+    if OCR_ENABLE_MKLDNN:
+        params.update(enable_mkldnn=True)
+    if OCR_PRECISION != "fp32":
+        params.update(precision=OCR_PRECISION, use_tensorrt=uses_gpu())
+    if GPU_MEMORY_MB:
+        import paddle
+
+        # gpu_mem is only the initial pool; the flag is the hard cap for the whole process
+        paddle.set_flags({"FLAGS_gpu_memory_limit_mb": GPU_MEMORY_MB})
+        params.update(gpu_mem=GPU_MEMORY_MB)
+    return params
+
+def uses_gpu():
+    """Whether the paddle backend runs on the GPU: OCR_DEVICE, or for auto whether Paddle was built with CUDA."""
+    if OCR_DEVICE != "auto":
+        return OCR_DEVICE == "gpu"
+    import paddle
+
+    return paddle.device.is_compiled_with_cuda()
+
+def onnx_backend_params():
+    return dict(
+        use_onnx=True,
+        use_gpu=False,
+        det_model_dir=str(OCR_ONNX_DIR / "det.onnx"),
+        rec_model_dir=str(OCR_ONNX_DIR / "rec.onnx"),
+        cls_model_dir=str(OCR_ONNX_DIR / "cls.onnx"),
+    )
+
+OCR_BACKENDS = {
+    "paddle": paddle_backend_params,
+    "onnx": onnx_backend_params,
+}
+
+def engine():
+    """PaddleOCR instance for the calling thread (predictors are not thread-safe)."""
+    return getattr(worker, "ocr", None) or ocr
+
+@contextmanager
+def hold_engine(index):
+    """Give the calling worker its engine for one job, counted per generation so a recycle knows when the old set is gone."""
+    generation = engine_generation  # read before engines: a swap in between only makes this look older
+    worker.ocr = engines[index]
+    with memory_lock:
+        engine_users[generation] += 1
+    try:
+        yield
+    finally:
+        worker.ocr = None
+        with memory_lock:
+            engine_users[generation] -= 1
+
+def build_ocr(backend=OCR_BACKEND):
+    """Create a PaddleOCR pipeline whose det/rec/cls predictors use the given backend."""
+    if backend not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR_BACKEND {backend!r}, expected one of {sorted(OCR_BACKENDS)}")
+
+    # imported here, not at the top: it pulls in Paddle and takes seconds the socket should not wait for
+    from paddleocr import PaddleOCR
+
+    params = dict(
+        use_angle_cls=True,
+        lang="en",
+        use_static=False,
+        **OCR_BACKENDS[backend](),
+    )
+    if OCR_PARAMS_FILE.exists():
+        params.update(json.loads(OCR_PARAMS_FILE.read_text()))
+    new_engine = PaddleOCR(**params)
+
+    # det/cls/rec timings for PROFILE sessions; free when not profiling
+    for attr, stage in (("text_detector", "det"), ("text_classifier", "cls"), ("text_recognizer", "rec")):
+        if hasattr(new_engine, attr):
+            setattr(new_engine, attr, profiler.predictor(getattr(new_engine, attr), stage))
+    return new_engine
+
+def warm_up(new_engine):
+    """Run one inference so the first real job does not pay for predictor setup."""
+    frame = None
+    try:
+        latest = get_latest_images(1)
+        frame = load_frame(latest[0]) if latest else None
+    except OSError:
+        pass
+    if frame is None:
+        frame = np.full((640, 640, 3), 255, dtype=np.uint8)
+
+    new_engine.ocr(frame, cls=True)
+    return new_engine
+
+@contextmanager
+def inference_affinity():
+    """Run the block on the inference cores: Paddle's OpenMP/MKL threads take the affinity of the thread that starts them."""
+    mask = os.sched_getaffinity(0) if OCR_CPU_AFFINITY else None
+    pin_current_thread(inference_cores())
+    try:
+        yield
+    finally:
+        pin_current_thread(mask)
+
+def build_engines():
+    """Fresh warmed-up engines; fewer than OCR_WORKERS if the service stops meanwhile."""
+    built = []
+    with inference_affinity():
+        while RUNNING and len(built) < max(1, OCR_WORKERS):
+            built.append(warm_up(build_ocr()))
+    return built
+
+def parse_cpu_list(spec):
+    """Parse a cpuset string such as "0-3,6" into a set of core ids."""
+    cores = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cores.update(range(int(first), int(last) + 1))
+        else:
+            cores.add(int(part))
+    return cores
+
+def inference_cores():
+    if not OCR_CPU_AFFINITY:
+        return None
+    available = os.sched_getaffinity(0)
+    return (parse_cpu_list(OCR_CPU_AFFINITY) & available) or available
+
+def decode_cores():
+    if not OCR_CPU_AFFINITY:
+        return None
+    available = os.sched_getaffinity(0)
+    return (available - inference_cores()) or available
+
+def pin_current_thread(cores):
+    # On Linux pid 0 addresses the calling thread, not the whole process; None leaves it alone
+    if cores:
+        os.sched_setaffinity(0, cores)
+
 def init_ocr():
-    global ocr
+    """Load the engines on the "loader" thread; the socket already accepts and queues triggers meanwhile."""
+    global ocr, engines, service_state, exit_code, RUNNING, engine_set_mb
+
+    with reload_lock:  # no RELOAD until loaded, and shutdown waits for the load to finish
+        start = time.monotonic()
+        try:
+            logging.info("Initializing PaddleOCR (%s backend, device %s, %d engine(s), cpu_threads=%s, mkldnn=%s, "
+                         "inference cores=%s)...", OCR_BACKEND, OCR_DEVICE, max(1, OCR_WORKERS),
+                         OCR_CPU_THREADS or "default", OCR_ENABLE_MKLDNN, OCR_CPU_AFFINITY or "all")
+            try:
+                import paddleocr  # noqa: F401 (the slow import, timed apart from the model load)
+            finally:
+                configure_logging()
+                signal_handlers_stale.set()
+            logging.info("PaddleOCR imported in %.1f s", time.monotonic() - start)
+
+            rss_before = memory.rss_mb()
+            with inference_affinity():
+                built = []
+                while RUNNING and len(built) < max(1, OCR_WORKERS):
+                    built.append(build_ocr())
+                if not RUNNING:
+                    return  # stopped while loading, skip the remaining engines and the warm-up
+                service_state = "warming"
+                logging.info("OCR engines loaded in %.1f s, warming up...", time.monotonic() - start)
+                engines = [warm_up(new_engine) for new_engine in built]
+            ocr = engines[0]
+            engine_set_mb = memory.rss_mb() - rss_before
+        except Exception:
+            logging.exception("Failed to initialize PaddleOCR")
+            exit_code, RUNNING = 1, False
+            return
+
+        check_recycle_headroom()
+
+        service_state = "ready"
+        startup["ready"] = time.monotonic() - STARTED
+        engines_ready.set()
+        logging.info("OCR service ready %.1f s after start (engines %.1f s, %d triggers queued meanwhile)",
+                     startup["ready"], time.monotonic() - start, scheduler.pending())
+        submit_io(record_startup, startup["accept"], startup["ready"])
+
+def reload_engines(recycle=False):
+    """Build and warm up a fresh set of engines, then swap them in between jobs.
+
+    Jobs keep running on the current engines while the new ones load, so
+    memory briefly holds both sets. On failure the current engines stay.
+    """
+    global ocr, engines, engine_generation, service_state, recycle_swapped
+
+    if not reload_lock.acquire(blocking=False):
+        logging.info("Reload already in progress")
+        return
 
     try:
-        logging.info("Initializing PaddleOCR...")
-        ocr = PaddleOCR(
-            use_angle_cls=True,
-            lang="en",
-            use_static=False,
-            #use_gpu=True, 
-            det_model_dir="/home/zzq/ocr_systemd/paddle_models/det",
-            rec_model_dir="/home/zzq/ocr_systemd/paddle_models/rec",
-            cls_model_dir="/home/zzq/ocr_systemd/paddle_models/cls"
-            )
+        service_state = "reloading"
+        start = time.time()
+        new_engines = build_engines()
+        if not RUNNING:
+            return  # stopping, the current engines do for the last jobs
+
+        engines, ocr = new_engines, new_engines[0]
+        engine_generation += 1
+        gc.collect()
+        memory.trim()
+        logging.info("OCR engines reloaded (generation %d) in %.1f s, RSS %.0f MB",
+                     engine_generation, time.time() - start, memory.rss_mb())
+        if recycle:
+            with memory_lock:
+                recycle_swapped = True
     except Exception:
-        logging.exception("Failed to initialize PaddleOCR")
-        sys.exit(1)
+        logging.exception("Reload failed, keeping the current engines")
+    finally:
+        service_state = "ready"
+        reload_lock.release()
+
+def request_reload(recycle=False):
+    if service_state in ("loading", "warming"):
+        logging.warning("Reload ignored, service is still loading")
+        return
+    threading.Thread(target=reload_engines, args=(recycle,), name="reload", daemon=True).start()
 
 def extract_car_and_container_codes(list_text):
     car_license = extract_car_license_code(list_text)
@@ -142,123 +1000,792 @@ def extract_container_code(list_text):
     matches = [t for t in list_text if CONTAINER_PATTERN.match(t)]
     return max(matches, key=len) if matches else ""
 
-def ocr_text_extraction(image_path):
-    result = ocr.ocr(str(image_path), cls=True)
+def camera_id(image_path):
+    """Camera name taken from the frame filename, e.g. 'Top_3.jpeg' -> 'Top'."""
+    name = Path(image_path).stem.rsplit("_", 1)[0]
+    if LANE_SOURCE == "subdir":
+        return f"{Path(image_path).parent.name}/{name}"
+    return name
+
+def to_ocr_input(img):
+    """Convert a PIL image into the BGR ndarray PaddleOCR accepts."""
+    return np.ascontiguousarray(np.asarray(img.convert("RGB"))[:, :, ::-1])
+
+def ocr_lines(result):
+    """Flatten a PaddleOCR result into [(text, score), ...]."""
     if not result or result == [None]:
-        return "", ""
+        return []
 
-    texts = [
-        text
-        for block in result
-        for (_, (text, _)) in block
+    return [
+        (text, score)
+        for block in result if block
+        for (_, (text, score)) in block
     ]
 
-    car_license, container_code = extract_car_and_container_codes(texts)
+def set_det_limit(limit):
+    for op in engine().text_detector.preprocess_op:
+        if hasattr(op, "limit_side_len"):
+            op.limit_side_len = limit
 
-    if car_license:
-        shutil.copy2(image_path, TEMP_IMAGE_PATH)
+def det_limit_candidates(image, camera):
+    """Detection limits to try for this frame, cheapest useful one first."""
+    if isinstance(image, np.ndarray):
+        long_side = max(image.shape[:2])
+    else:
+        with Image.open(image) as img:
+            long_side = max(img.size)
 
-    return car_license, container_code
+    # every limit above the frame's long side runs at native size; keep only one
+    limits = []
+    for limit in DET_LIMITS:
+        limits.append(limit)
+        if limit >= long_side:
+            break
 
-def ocr_text_extraction_with_image_enhancement(image_path):
-    with Image.open(image_path) as img:
-        img = ImageEnhance.Contrast(img).enhance(2.0)
-        result = ocr.ocr(img, cls=True)
+    det_frame_count[camera] += 1
+    wins = det_limit_wins[camera]
+    if not wins or det_frame_count[camera] % DET_PROBE_EVERY == 0:
+        return limits
 
-    if not result or result == [None]:
-        return "", ""
+    usual = Counter(wins).most_common(1)[0][0]
+    return [limit for limit in limits if limit >= usual] or limits[-1:]
 
-    texts = [
-        text
-        for block in result
-        for (_, (text, _)) in block
-    ]
+def cls_first(camera):
+    """Whether this camera's frames should use the angle classifier on the first pass."""
+    cls_frame_count[camera] += 1
+    history = cls_needed[camera]
+    if not history or cls_frame_count[camera] % CLS_PROBE_EVERY == 0:
+        return False
+
+    enabled = sum(history) / len(history) >= CLS_ENABLE_RATE
+    if enabled != (camera in cls_cameras):
+        logging.info("Camera %s: angle classifier %s", camera, "enabled" if enabled else "disabled")
+        (cls_cameras.add if enabled else cls_cameras.discard)(camera)
+    return enabled
+
+def is_confident(lines, car_license, container_code):
+    # a bare plate prefix means the number was missed
+    if car_license in CAR_PREFIX or not (car_license or container_code):
+        return False
+    return sum(score for _, score in lines) / len(lines) >= OCR_MIN_SCORE
+
+def ocr_pass(image, use_cls):
+    """Run one OCR pass and return (car_license, container_code, confident)."""
+    lines = ocr_lines(engine().ocr(image, cls=use_cls))
+    passes = getattr(worker, "passes", None)
+    if passes is not None:
+        passes.append({"cls": use_cls, "tokens": [[text, round(float(score), 3)] for text, score in lines]})
+    car_license, container_code = extract_car_and_container_codes([text for text, _ in lines])
+    return car_license, container_code, is_confident(lines, car_license, container_code)
+
+def pass_rank(result):
+    """Preference between ocr_pass results for one frame: confident, then a full code, then any code."""
+    car_license, container_code, confident = result
+    full = bool(container_code) or bool(car_license) and car_license not in CAR_PREFIX
+    return confident, full, bool(car_license or container_code)
+
+def ocr_read(image, camera):
+    """OCR one frame (path or BGR ndarray) and return (car_license, container_code)."""
+    use_cls = not CLS_ADAPTIVE or cls_first(camera)
+    # an empty OCR_DET_LIMITS leaves the engine's own limit, as without OCR_DET_ADAPTIVE
+    limits = (det_limit_candidates(image, camera) if DET_ADAPTIVE else None) or [None]
+
+    # a later pass only replaces the codes when it read something better
+    best = None
+    for limit in limits:
+        if limit:
+            set_det_limit(limit)
+        result = ocr_pass(image, use_cls)
+        if best is None or pass_rank(result) > pass_rank(best):
+            best = result
 
-    car_license, container_code = extract_car_and_container_codes(texts)
+        if result[2]:
+            break
 
-    if car_license:
-        shutil.copy2(image_path, TEMP_IMAGE_PATH)
+    if CLS_ADAPTIVE and not use_cls:
+        needed = False
+        if not best[2]:
+            # retry at the last limit with 180-degree correction of the text crops
+            retry = ocr_pass(image, True)
+            needed = retry[2]
+            if pass_rank(retry) > pass_rank(best):
+                best = retry
+        cls_needed[camera].append(needed)
+
+    car_license, container_code, confident = best
+
+    if limit and confident:
+        det_limit_wins[camera].append(limit)
+        logging.debug("Camera %s: detection settled at limit %s", camera, limit)
 
     return car_license, container_code
 
+def ocr_text_extraction(image_path, frame):
+    return ocr_read(frame, camera_id(image_path))
+
+def ocr_text_extraction_with_image_enhancement(image_path):
+    frame = decode_pool.submit(load_enhanced_frame, image_path).result()
+    return ocr_read(frame, camera_id(image_path))
+
 # --------------------- Image Handling ---------------------
-def get_latest_images(limit=2):
-    files = [
-        IMG_DIR / f for f in os.listdir(IMG_DIR)
-        if f.lower().endswith(IMAGE_EXTS)
-    ]
+def lane_frames(lane):
+    """Directory entries of all frames of a lane."""
+    folder = IMG_DIR / lane if LANE_SOURCE == "subdir" else IMG_DIR
+    prefix = lane + LANE_SEPARATOR if LANE_SOURCE == "prefix" else ""
+    if not folder.is_dir():
+        return []
+
+    with os.scandir(folder) as it:
+        return [
+            entry for entry in it
+            if entry.name.lower().endswith(IMAGE_EXTS) and entry.name.startswith(prefix)
+        ]
+
+def get_latest_images(limit=2, lane=DEFAULT_LANE):
+    files = [Path(entry.path) for entry in lane_frames(lane)]
     files.sort(key=os.path.getmtime, reverse=True)
     return files[:limit]
 
-def is_image_readable(path):
+def newest_frame_time(lane):
+    """mtime of the lane's newest frame, 0 if it has none."""
+    newest = 0.0
+    for entry in lane_frames(lane):
+        try:
+            newest = max(newest, entry.stat().st_mtime)
+        except FileNotFoundError:
+            pass
+    return newest
+
+def newest_lane():
+    """Lane of the most recently written frame, for triggers that name no lane."""
+    if LANE_SOURCE == "none":
+        return DEFAULT_LANE
+
+    if LANE_SOURCE == "subdir":
+        entries = [
+            (entry.stat().st_mtime, lane.name)
+            for lane in os.scandir(IMG_DIR) if lane.is_dir()
+            for entry in os.scandir(lane.path)
+            if entry.name.lower().endswith(IMAGE_EXTS)
+        ]
+    else:
+        entries = [
+            (entry.stat().st_mtime, entry.name.split(LANE_SEPARATOR, 1)[0])
+            for entry in os.scandir(IMG_DIR)
+            if entry.name.lower().endswith(IMAGE_EXTS) and LANE_SEPARATOR in entry.name
+        ]
+
+    return max(entries)[1] if entries else DEFAULT_LANE
+
+def best_frames(image_files, lane, trace):
+    """Usable frames, sharpest first, at most QUALITY_TOP_K per camera."""
+    scores = [decode_pool.submit(score_frame, img_file) for img_file in image_files]
+
+    ranked = []
+    for img_file, score in zip(image_files, scores):
+        info = trace.frame(img_file)
+        try:
+            score = score.result()
+        except Exception:
+            info["skipped"] = "unreadable"
+            continue  # decoding it would fail as well
+        info["sharpness"], info["clipped"] = round(score.sharpness, 1), round(score.clipped, 3)
+        if quality.usable(score, QUALITY_MIN_SHARPNESS, QUALITY_MAX_CLIPPED):
+            ranked.append((score.sharpness, img_file))
+        else:
+            info["skipped"] = "quality"
+            logging.info("Lane %s: %s rejected (sharpness %.0f, clipped %.0f%%)",
+                         lane, img_file.name, score.sharpness, score.clipped * 100)
+    ranked.sort(key=lambda item: item[0], reverse=True)
+
+    per_camera = Counter()
+    best = []
+    for _, img_file in ranked:
+        camera = camera_id(img_file)
+        if QUALITY_TOP_K and per_camera[camera] >= QUALITY_TOP_K:
+            trace.frame(img_file)["skipped"] = "top_k"
+            continue
+        per_camera[camera] += 1
+        best.append(img_file)
+    return best
+
+@profiler.timed("quality")
+def score_frame(path):
+    return quality.score(path)
+
+@profiler.timed("decode")
+def load_frame(path):
+    """Decode a frame into a BGR ndarray, or None if it is unreadable."""
     try:
         with Image.open(path) as img:
-            img.verify()
-        return True
+            return to_ocr_input(img)
     except Exception:
-        return False
+        return None
+
+@profiler.timed("enhance")
+def load_enhanced_frame(path):
+    with Image.open(path) as img:
+        return to_ocr_input(ImageEnhance.Contrast(img).enhance(2.0))
 
 # --------------------- Processing ---------------------
-def process_latest_images():
-    image_files = get_latest_images(2)
-    if len(image_files) != 2:
-        send_signal_to_ipc("retake images")
-        return
+def retake_message(lane):
+    return "retake images" if LANE_SOURCE == "none" else f"retake images {lane}"
 
-    car_code, container_code  = "", ""
-    for img_file in image_files:
-        if not is_image_readable(img_file):
+def process_latest_images(lane=DEFAULT_LANE, trace=None):
+    trace = trace or JobTrace(lane, time.time())
+    image_files = get_latest_images(FRAMES_PER_JOB, lane)
+    if len(image_files) < min(MIN_FRAMES, FRAMES_PER_JOB):
+        trace.outcome = "missing"
+        send_signal_to_ipc(retake_message(lane))
+        return False
+
+    with trace.stage("frame_wait"):
+        image_files, partial = frame_gate.wait(image_files, FRAME_WAIT)
+    for img_file in partial:
+        trace.frame(img_file)["skipped"] = "incomplete"
+        logging.warning("Lane %s: %s still incomplete after %.1f s, skipped", lane, img_file.name, FRAME_WAIT)
+    if QUALITY_GATE and image_files:
+        with trace.stage("quality"):
+            image_files = best_frames(image_files, lane, trace)
+    if not image_files:
+        trace.outcome = "unusable"
+        logging.warning("Lane %s: no usable frame, requesting retake", lane)
+        send_signal_to_ipc(retake_message(lane))
+        return False
+
+    # decode all frames up front so frame k+1 is prepared while frame k is inferred
+    frames = [decode_pool.submit(load_frame, img_file) for img_file in image_files]
+
+    car_code, container_code, car_image, container_image = "", "", None, None
+    for img_file, frame in zip(image_files, frames):
+        info = trace.frame(img_file)
+        with trace.stage("decode_wait", info):
+            frame = frame.result()
+        if frame is None:
+            info["skipped"] = "unreadable"
             continue
 
-        car, container = ocr_text_extraction(img_file)
+        speculative = speculate(img_file, info)
+        # ocr_pass() adds the raw tokens of every pass here
+        worker.passes = info["passes"] = []
+        try:
+            with trace.stage("ocr", info):
+                car, container = ocr_text_extraction(img_file, frame)
+            raw_weak[camera_id(img_file)].append(first_pass_weak(info["passes"]))
 
-        if not car and not container:
-            car, container = ocr_text_extraction_with_image_enhancement(img_file)
+            if not car and not container:
+                with trace.stage("enhance", info):
+                    car, container = enhanced_codes(img_file, speculative, info)
+            elif speculative is not None:
+                info["speculative"] = "cancelled" if speculative.future.cancel() else "discarded"
+        finally:
+            worker.passes = None
+        info["codes"] = [car, container]
 
         if car and len(car) > len(car_code):
-            car_code = car
+            car_code, car_image = car, img_file
 
         if container and len(container) > len(container_code):
-            container_code = container
+            container_code, container_image = container, img_file
 
     # write into database
     if car_code or container_code:
+        trace.outcome = "read"
         timestamp_value = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         match_status_value = 'Yes'
-        record_to_db(timestamp_value, car_code, container_code, match_status_value)
-    else:
-        logging.warning("OCR failed, requesting retake")
-        send_signal_to_ipc("retake images")
+        submit_io(store_result, timestamp_value, car_code, container_code, match_status_value, lane,
+                  car_image, car_image or container_image, trace)
+        return True
 
-# ---------------------------- main ------------------------
-def main():    
-    init_ocr()
-    server = start_ipc_server()      
+    trace.outcome = "failed"
+    logging.warning("Lane %s: OCR failed, requesting retake", lane)
+    send_signal_to_ipc(retake_message(lane))
+    return False
 
-    while RUNNING:
+def speculate(img_file, info):
+    """Offer the enhanced pass of a frame likely to need it to the idle workers (OCR_SPECULATE)."""
+    if not SPECULATE or OCR_WORKERS < 2 or scheduler.pending():
+        return None
+
+    history = raw_weak[camera_id(img_file)]
+    likely = (info.get("sharpness", SPECULATE_SHARPNESS) < SPECULATE_SHARPNESS
+              or (history and sum(history) / len(history) >= SPECULATE_RATE))
+    if not likely:
+        return None
+    task = SideTask(enhanced_pass, img_file)
+    scheduler.offer(task)
+    info["speculative"] = "offered"
+    return task
+
+def first_pass_weak(passes):
+    """Whether the first OCR pass over a frame (tokens as in the job detail) found no confident code."""
+    if not passes:
+        return True
+    lines = passes[0]["tokens"]
+    car_license, container_code = extract_car_and_container_codes([text for text, _ in lines])
+    return not is_confident(lines, car_license, container_code)
+
+def enhanced_pass(image_path):
+    """Speculative enhanced pass, run by an idle worker: its codes and the raw tokens of its passes."""
+    worker.passes = []
+    try:
+        return ocr_text_extraction_with_image_enhancement(image_path), worker.passes
+    finally:
+        worker.passes = None
+
+def enhanced_codes(img_file, speculative, info):
+    """Codes of the enhanced pass: taken over from an idle worker that already started it, else run here."""
+    if speculative is None or speculative.future.cancel():
+        if speculative is not None:
+            info["speculative"] = "not taken"  # no worker was idle, run here as without OCR_SPECULATE
+        return ocr_text_extraction_with_image_enhancement(img_file)
+
+    codes, passes = speculative.future.result()
+    info["passes"].extend(passes)
+    info["speculative"] = "used"
+    return codes
+
+@profiler.timed("io")
+def store_result(timestamp, car_code, container_code, match_status, lane, car_image, row_image, trace=None):
+    # copy first so the new row never points the dashboard at the previous frame
+    if car_image:
+        shutil.copy2(car_image, TEMP_IMAGE_PATH)
+
+    # the blob is in place before the row that references it
+    blob = store_blob(row_image) if row_image else None
+    idx = record_to_db(timestamp, car_code, container_code, match_status, lane, blob)
+    if trace is not None:
+        trace.code_idx = idx  # record_job runs after this on the same thread
+    if row_image:
+        write_thumbnails(idx, row_image)
+
+    recent_rows.append({
+        "idx": idx,
+        "timestamp": timestamp,
+        "car_code": car_code,
+        "container_code": container_code,
+        "match_status": match_status
+    })
+    publish_snapshot()
+
+def store_blob(image_path):
+    try:
+        return blobs.put(image_path)
+    except OSError:
+        logging.exception("Storing frame %s failed", image_path)
+        return None
+
+def write_thumbnails(idx, image_path):
+    """Render the dashboard sizes before the row is published, so /image hits the cache."""
+    try:
+        for width in THUMB_EAGER_WIDTHS:
+            img = thumbnails.resize(image_path, width)
+            for fmt in thumbnails.FORMATS:
+                thumb_cache.put(idx, width, fmt, thumbnails.encode(img, fmt))
+    except Exception:
+        logging.exception("Thumbnails for row %s failed", idx)
+
+# --------------------- I/O Stage ---------------------
+def submit_io(func, *args):
+    """Queue a DB/file/IPC task for the I/O thread; blocks when the queue is full."""
+    io_queue.put((func, args))
+
+def io_stage():
+    while True:
+        task = io_queue.get()
+        if task is None:
+            return
+
+        func, args = task
         try:
-            conn, addr = server.accept()
-            msg = conn.recv(1024).decode().strip()
-            conn.close()
+            func(*args)
+        except Exception:
+            logging.exception("I/O task %s failed", func.__name__)
 
-            logging.info("IPC message received: %s", msg)
+# --------------------- Job Trace ---------------------
+class JobTrace:
+    """Timings and raw OCR output of one job, stored in the jobs table by the I/O stage."""
 
-            if msg == "IMAGE_READY":
-                process_latest_images()
+    def __init__(self, lane, trigger_time, triggers=1):
+        self.lane = lane
+        self.trigger_time = trigger_time
+        self.triggers = triggers
+        self.stages = defaultdict(float)  # stage -> ms spent in the worker
+        self.frames = {}                  # file name -> what happened to that frame
+        self.outcome = "error"
+        self.code_idx = None
+        self.memory = {}                  # sampled after the job, see check_memory()
 
-        except socket.timeout:
-            continue
-            
+    def frame(self, img_file):
+        return self.frames.setdefault(img_file.name, {"camera": camera_id(img_file)})
+
+    @contextmanager
+    def stage(self, name, frame=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self.stages[name] += ms
+            if frame is not None:
+                frame[f"{name}_ms"] = round(ms, 1)
+
+# --------------------- Lane Scheduling ---------------------
+class LaneJob:
+    __slots__ = ("trigger_time", "due", "triggers")
+
+    def __init__(self, trigger_time, due):
+        self.trigger_time = trigger_time  # first trigger
+        self.due = due                    # earliest start, pushed back by later triggers and frames
+        self.triggers = 1
+
+class SideTask:
+    """Work a job offers to idle workers (see speculate), run by the first one free unless cancelled first."""
+    __slots__ = ("func", "args", "future")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+        self.future = Future()
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            self.future.set_result(self.func(*self.args))
         except Exception as e:
-            if RUNNING:
-                logging.error("IPC error: %s", e)
+            self.future.set_exception(e)
+
+class LaneScheduler:
+    """Per-lane job queues served round-robin by the OCR workers.
+
+    A lane is worked on by at most one worker at a time and goes to the back
+    of the line after each job, so a burst on one lane only queues behind
+    itself instead of delaying the other lanes.
+
+    A job is held until the lane has been quiet (no trigger, no new frame)
+    for `debounce` seconds; triggers that arrive meanwhile are merged into it,
+    since it reads the newest frames when it runs anyway.
+
+    Workers with no due lane job take SideTasks, which jobs offer for
+    work an idle worker may do in parallel.
+    """
+
+    def __init__(self, queue_size, debounce=0.0, debounce_max=0.0):
+        self.queue_size = queue_size
+        self.debounce = debounce
+        self.debounce_max = debounce_max
+        self.queues = defaultdict(deque)  # lane -> LaneJob
+        self.ready = deque()              # lanes with work and no worker
+        self.busy = set()
+        self.side = deque()               # SideTasks for idle workers
+        self.coalesced = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def submit(self, lane):
+        with self.cond:
+            queue = self.queues[lane]
+            now = time.time()
+            if queue and now < queue[-1].due:
+                job = queue[-1]
+                job.triggers += 1
+                job.due = max(job.due, min(now + self.debounce, job.trigger_time + self.debounce_max))
+                self.coalesced += 1
+                return True
+
+            if len(queue) >= self.queue_size:
+                logging.warning("Lane %s: %d jobs pending, trigger dropped", lane, len(queue))
+                return False
+
+            queue.append(LaneJob(now, now + self.debounce))
+            if lane not in self.busy and lane not in self.ready:
+                self.ready.append(lane)
+                self.cond.notify()
+            return True
+
+    def offer(self, task):
+        with self.cond:
+            self.side = deque(t for t in self.side if not t.future.cancelled())
+            self.side.append(task)
+            self.cond.notify()
+
+    def next_job(self):
+        """Block until a lane's job is due and return (lane, job), a SideTask if only one of those is
+        waiting, or None once closed."""
+        while True:
+            with self.cond:
+                lane = self.wait_due()
+                if lane is None or isinstance(lane, SideTask):
+                    return lane
+                # claimed, so no other worker takes it while the folder is checked outside the lock
+                self.ready.remove(lane)
+                self.busy.add(lane)
+                job = self.queues[lane][0]
+                if not self.debounce:
+                    return lane, self.queues[lane].popleft()
+
+            last_frame = newest_frame_time(lane)
+
+            with self.cond:
+                # frames still landing: the camera is not done with this truck
+                job.due = max(job.due, min(last_frame + self.debounce, job.trigger_time + self.debounce_max))
+                if job.due <= time.time():
+                    return lane, self.queues[lane].popleft()
+                self.busy.discard(lane)
+                self.ready.appendleft(lane)
+
+    def wait_due(self):
+        """First ready lane whose job is due (waiting for it), else a SideTask, or None once closed. Holds cond."""
+        while not self.closed:
+            now = time.time()
+            for lane in self.ready:
+                if self.queues[lane][0].due <= now:
+                    return lane
+            if self.side:
+                return self.side.popleft()
+
+            wait = min((self.queues[lane][0].due for lane in self.ready), default=now + 1) - now
+            self.cond.wait(wait if self.ready else None)
+        return None
+
+    def pending(self):
+        with self.cond:
+            return sum(len(queue) for queue in self.queues.values())
+
+    def done(self, lane):
+        with self.cond:
+            self.busy.discard(lane)
+            if self.queues[lane]:
+                self.ready.append(lane)
+                self.cond.notify()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+def ocr_worker(index):
+    pin_current_thread(inference_cores())
+    # jobs triggered during startup stay queued until the engines are loaded
+    while not engines_ready.wait(0.2):
+        if scheduler.closed:
+            return
+
+    while True:
+        job = scheduler.next_job()
+        if job is None:
+            return
+        if isinstance(job, SideTask):
+            with hold_engine(index):
+                job.run()
+            continue
+
+        lane, job = job
+        trace = JobTrace(lane, job.trigger_time, job.triggers)
+        start = time.time()
+        read_ok = False
+        try:
+            # hold the engine only for the job, so a reload frees the old one
+            with hold_engine(index), profiler.job():
+                read_ok = process_latest_images(lane, trace)
+        except Exception:
+            logging.exception("Lane %s: processing failed", lane)
+        finally:
+            scheduler.done(lane)
+
+        busy_ms = (time.time() - start) * 1000
+        queue_ms = (start - job.trigger_time) * 1000
+        logging.info("Lane %s: job done in %.0f ms (queued %.0f ms, %d triggers)", lane, busy_ms, queue_ms, job.triggers)
+        check_memory(trace)
+        submit_io(record_lane_metrics, lane, read_ok, busy_ms, queue_ms, job.triggers - 1)
+        submit_io(record_job, trace, queue_ms, busy_ms)
+
+def check_memory(trace):
+    """Sample memory after a job and recycle the engines once RSS passes the soft limit.
+
+    The first sample after a recycle's engines are swapped in and no job holds
+    an engine of an older generation any more is kept as recycle_rss; if it
+    is still above the limit, the growth is not in the engines and recycling
+    stops.
+    """
+    global jobs_since_recycle, recycles, recycle_swapped, recycle_rss, recycling_stopped
+
+    if MEMORY_TRIM:
+        memory.trim()
+    rss = memory.rss_mb()
+    trace.memory = dict(rss_mb=round(rss, 1), **(memory.heap() or {}))
+    gpu = gpu_memory_mb()
+    if gpu is not None:
+        trace.memory["gpu_mb"] = round(gpu, 1)
+
+    with memory_lock:
+        jobs_since_recycle += 1
+        old_users = sum(count for generation, count in engine_users.items() if generation < engine_generation)
+        recycled = recycle_swapped and not old_users
+        if recycled:
+            recycle_swapped = False
+            recycle_rss = rss
+            recycling_stopped = rss > MEMORY_SOFT_LIMIT_MB
+        recycle = (MEMORY_SOFT_LIMIT_MB and rss > MEMORY_SOFT_LIMIT_MB and not recycling_stopped
+                   and jobs_since_recycle >= MEMORY_RECYCLE_JOBS and service_state == "ready")
+        if recycle:
+            jobs_since_recycle = 0
+            recycles += 1
+    if recycled and recycling_stopped:
+        logging.warning("RSS still %.0f MB after recycling the OCR engines (soft limit %.0f MB), "
+                        "the growth is not in the engines; no more recycles until restart",
+                        rss, MEMORY_SOFT_LIMIT_MB)
+    elif recycled:
+        logging.info("RSS %.0f MB after recycling the OCR engines", rss)
+    if recycle:
+        logging.warning("RSS %.0f MB above the %.0f MB soft limit, recycling the OCR engines",
+                        rss, MEMORY_SOFT_LIMIT_MB)
+        request_reload(recycle=True)
+
+def check_recycle_headroom():
+    """Warn when a recycle at the soft limit, which briefly holds a second engine set, would not fit the cgroup."""
+    limit = memory.limit_mb()
+    if not MEMORY_SOFT_LIMIT_MB or limit is None or engine_set_mb is None:
+        return
+    logging.info("One engine set takes %.0f MB; a recycle at the %.0f MB soft limit peaks near %.0f MB of %.0f MB",
+                 engine_set_mb, MEMORY_SOFT_LIMIT_MB, MEMORY_SOFT_LIMIT_MB + engine_set_mb, limit)
+    if MEMORY_SOFT_LIMIT_MB + engine_set_mb > limit:
+        logging.warning("OCR_MEMORY_SOFT_LIMIT_MB=%.0f leaves no room for a second engine set under the %.0f MB "
+                        "memory limit, a recycle would be OOM-killed; set it to %.0f or less",
+                        MEMORY_SOFT_LIMIT_MB, limit, limit - engine_set_mb)
+
+def gpu_memory_mb():
+    """Memory reserved by Paddle's GPU allocator, or None when not running on a GPU."""
+    if OCR_BACKEND != "paddle":
+        return None
+    import paddle
+
+    if not paddle.device.is_compiled_with_cuda() or not paddle.device.cuda.device_count():
+        return None
+    return paddle.device.cuda.memory_reserved() / memory.MB
+
+def start_workers():
+    global scheduler, decode_pool
+
+    scheduler = LaneScheduler(LANE_QUEUE_SIZE, TRIGGER_DEBOUNCE, TRIGGER_DEBOUNCE_MAX)
+    decode_pool = ThreadPoolExecutor(
+        max_workers=OCR_DECODE_WORKERS,
+        thread_name_prefix="decode",
+        initializer=pin_current_thread,
+        initargs=(decode_cores(),),
+    )
+
+    workers = [
+        threading.Thread(target=ocr_worker, args=(i,), name=f"ocr-worker-{i}", daemon=True)
+        for i in range(max(1, OCR_WORKERS))
+    ]
+    workers.append(threading.Thread(target=io_stage, name="io", daemon=True))
+    for t in workers:
+        t.start()
+    return workers
+
+def stop_workers(workers):
+    scheduler.close()
+    for t in workers[:-1]:
+        t.join(timeout=30)
+
+    # the I/O thread drains what the workers queued before stopping
+    io_queue.put(None)
+    workers[-1].join(timeout=30)
+    decode_pool.shutdown(wait=False)
+
+def status_line():
+    line = (f"{service_state} generation={engine_generation} pending={scheduler.pending()} "
+            f"coalesced={scheduler.coalesced} rss_mb={memory.rss_mb():.0f} recycles={recycles}")
+    if recycle_rss is not None:
+        line += f" recycle_rss_mb={recycle_rss:.0f}" + (" recycling=stopped" if recycling_stopped else "")
+    return line + "".join(f" {name}_s={seconds:.2f}" for name, seconds in list(startup.items()))
+
+def handle_message(conn, msg):
+    """Answer control messages (STATUS, RELOAD, PROFILE) and queue IMAGE_READY triggers."""
+    if msg == "STATUS":
+        conn.sendall(status_line().encode() + b"\n")
+    elif msg == "RELOAD":
+        request_reload()
+        conn.sendall(b"reloading\n")
+    elif msg.split()[:1] == ["PROFILE"]:
+        conn.sendall(profile_command(msg.split()[1:]).encode() + b"\n")
+    else:
+        lane = trigger_lane(msg)
+        if lane:
+            scheduler.submit(lane)
+
+def profile_command(args):
+    """PROFILE [<jobs> | <seconds>s | stop]; returns the reply."""
+    arg = args[0] if args else ""
+    if arg == "stop":
+        out = profiler.stop()
+        return f"written {out}" if out else "not profiling"
+
+    jobs, seconds = PROFILE_JOBS, 0.0
+    try:
+        if arg.endswith("s"):
+            jobs, seconds = 0, float(arg[:-1])
+        elif arg:
+            jobs = int(arg)
+    except ValueError:
+        return "usage: PROFILE [<jobs> | <seconds>s | stop]"
+
+    if not profiler.start(jobs=jobs, seconds=seconds):
+        return "already profiling"
+    return f"profiling jobs={jobs or '-'} seconds={seconds or '-'} dir={PROFILE_DIR}"
+
+def trigger_lane(msg):
+    """Lane named by an IMAGE_READY message, or None if the message is not a valid trigger."""
+    parts = msg.split()
+    if not parts or parts[0] != "IMAGE_READY":
+        return None
+    if len(parts) == 1:
+        return newest_lane()
+    if LANE_SOURCE == "none" or not LANE_PATTERN.match(parts[1]):
+        logging.warning("Ignoring trigger for unknown lane: %s", msg)
+        return None
+    return parts[1]
+
+# ---------------------------- main ------------------------
+def main():    
+    global notifier
+
+    # Listen before anything slow: senders connect from the first moment (the
+    # kernel holds them in the backlog until serve_ipc), get STATUS
+    # loading/warming/ready, and their triggers queue until the engines are up.
+    install_signal_handlers()
+    server = start_ipc_server()
+    # threads inherit the mask: a stop before the IPC loop restores the handlers stays pending
+    signal.pthread_sigmask(signal.SIG_BLOCK, SHUTDOWN_SIGNALS)
+
+    init_db()
+    load_recent_rows()
+    notifier = Notifier(IPC_REPLY, NOTIFY_OUTBOX)
+    notifier.start()
+    workers = start_workers()
+    threading.Thread(target=init_ocr, name="loader", daemon=True).start()
+
+    serve_ipc(server)
 
     server.close()
+    stop_workers(workers)
+    notifier.close()
+    # the loader, a RELOAD or a memory recycle may still be building an engine; exiting under
+    # it aborts in native code. They stop after the engine in progress, so wait for the first
+    # load however long it takes (a cold start can exceed any timeout), and up to 30 s for a reload.
+    if service_state in ("loading", "warming"):
+        reload_lock.acquire()
+    else:
+        reload_lock.acquire(timeout=30)
+
     # Cleanup socket file on exit
-    if os.path.exists(SOCKET_PATH):
-        os.remove(SOCKET_PATH)
+    transport.cleanup(IPC_LISTEN)
         
     logging.info("OCR service stopped!")
+    if exit_code:
+        sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
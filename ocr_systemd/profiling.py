@@ -0,0 +1,211 @@
+"""
+On-demand profiling of the OCR service.
+
+A session is started with `PROFILE` on the trigger socket or SIGUSR1 and
+covers the next N jobs or T seconds. While it runs, every job is profiled
+with cProfile in its worker thread, and stage spans (decode, quality,
+det/cls/rec predictors, I/O) are recorded from every thread. When it ends,
+everything is written to <directory>/<start time>/:
+  jobs.prof    cProfile stats of all jobs (python -m pstats, snakeviz, gprof2dot)
+  trace.json   stage spans in Chrome trace format (chrome://tracing, ui.perfetto.dev)
+  stages.txt   per-stage count, total, mean and p95, with Paddle's own predictor times
+When no session is running, each hook costs one attribute check.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+
+MAX_SPANS = 200_000
+
+
+class Profiler:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.active = False
+        self.lock = threading.RLock()  # start() also runs from the SIGUSR1 handler
+        self.timer = None
+        self.reset()
+
+    def reset(self):
+        self.stats = None
+        self.spans = []      # (stage, thread id, start, seconds, paddle seconds or None)
+        self.threads = {}    # thread id -> name, for the trace viewer
+        self.jobs_left = 0
+        self.jobs_done = 0
+        self.started = None
+        self.origin = 0.0
+
+    # --------------------- Sessions ---------------------
+    def start(self, jobs=0, seconds=0.0):
+        """Profile the next `jobs` jobs and/or `seconds` seconds, whichever ends first.
+
+        Returns False if a session is already running.
+        """
+        with self.lock:
+            if self.active:
+                return False
+            self.reset()
+            self.jobs_left = jobs
+            self.started = datetime.now()
+            self.origin = time.perf_counter()
+            if seconds:
+                self.timer = threading.Timer(seconds, self.stop)
+                self.timer.daemon = True
+                self.timer.start()
+            self.active = True
+        logging.info("Profiling started (jobs=%s, seconds=%s)", jobs or "-", seconds or "-")
+        return True
+
+    def stop(self):
+        """End the session and write its files; returns their directory, or None if nothing ran."""
+        with self.lock:
+            if not self.active:
+                return None
+            self.active = False
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            stats, spans, threads, jobs, started = self.stats, self.spans, self.threads, self.jobs_done, self.started
+            self.reset()
+
+        out = self.directory / started.strftime("%Y%m%d-%H%M%S")
+        try:
+            out.mkdir(parents=True, exist_ok=True)
+            if stats is not None:
+                stats.dump_stats(out / "jobs.prof")
+            write_trace(out / "trace.json", spans, threads)
+            write_summary(out / "stages.txt", spans, jobs)
+        except OSError:
+            logging.exception("Writing profile to %s failed", out)
+            return None
+        logging.info("Profile of %d jobs written to %s", jobs, out)
+        return out
+
+    # --------------------- Hooks ---------------------
+    @contextmanager
+    def job(self):
+        """Profile one job in the calling thread if a session is running."""
+        if not self.active:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            profile = None  # another profiler is active in this interpreter (Python 3.12+)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            self.record("job", start, time.perf_counter() - start)
+            self.job_done(profile)
+
+    def job_done(self, profile):
+        with self.lock:
+            if not self.active:
+                return
+            if profile is not None:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+            self.jobs_done += 1
+            finished = self.jobs_left and self.jobs_done >= self.jobs_left
+        if finished:
+            self.stop()
+
+    def timed(self, stage):
+        """Decorator recording each call as a `stage` span while profiling."""
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.active:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(stage, start, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def predictor(self, predictor, stage):
+        return TimedPredictor(self, predictor, stage)
+
+    def record(self, stage, start, seconds, paddle=None):
+        thread = threading.current_thread()
+        with self.lock:
+            if not self.active or len(self.spans) >= MAX_SPANS:
+                return
+            self.threads[thread.ident] = thread.name
+            self.spans.append((stage, thread.ident, start - self.origin, seconds, paddle))
+
+
+class TimedPredictor:
+    """A PaddleOCR det/cls/rec predictor that records its calls while profiling.
+
+    The predictors return their own elapsed time as the last tuple item; it is
+    kept next to the wall time. Other attributes go to the wrapped predictor.
+    """
+
+    def __init__(self, profiler, predictor, stage):
+        self.profiler = profiler
+        self.predictor = predictor
+        self.stage = stage
+
+    def __call__(self, *args, **kwargs):
+        if not self.profiler.active:
+            return self.predictor(*args, **kwargs)
+        start = time.perf_counter()
+        result = self.predictor(*args, **kwargs)
+        paddle = result[-1] if isinstance(result, tuple) and isinstance(result[-1], float) else None
+        self.profiler.record(self.stage, start, time.perf_counter() - start, paddle)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.predictor, name)
+
+
+# --------------------- Output ---------------------
+def write_trace(path, spans, threads):
+    pid = os.getpid()
+    events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+        for tid, name in threads.items()
+    ]
+    for stage, tid, start, seconds, paddle in spans:
+        event = {"name": stage, "ph": "X", "pid": pid, "tid": tid,
+                 "ts": round(start * 1e6), "dur": round(seconds * 1e6)}
+        if paddle is not None:
+            event["args"] = {"paddle_ms": round(paddle * 1000, 3)}
+        events.append(event)
+    path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+
+
+def write_summary(path, spans, jobs):
+    by_stage = defaultdict(list)
+    paddle = defaultdict(float)
+    for stage, _, _, seconds, paddle_seconds in spans:
+        by_stage[stage].append(seconds * 1000)
+        if paddle_seconds is not None:
+            paddle[stage] += paddle_seconds * 1000
+
+    lines = [f"{jobs} jobs", f"{'stage':<10}{'count':>8}{'total ms':>12}{'mean ms':>10}{'p95 ms':>10}{'paddle ms':>12}"]
+    for stage, values in sorted(by_stage.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        p95 = values[min(len(values) - 1, int(0.95 * len(values)))]
+        lines.append(f"{stage:<10}{len(values):>8}{sum(values):>12.1f}{sum(values) / len(values):>10.1f}{p95:>10.1f}"
+                     + (f"{paddle[stage]:>12.1f}" if stage in paddle else f"{'-':>12}"))
+    path.write_text("\n".join(lines) + "\n")
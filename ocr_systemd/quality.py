@@ -0,0 +1,46 @@
+"""
+Blur/exposure scoring of camera frames, cheap enough to run before OCR.
+
+Each frame is decoded straight to a small greyscale copy (JPEG draft mode
+scales in the decoder) and scored with numpy:
+  sharpness  variance of the second derivative, the lower of the
+             horizontal and vertical one: defocus flattens both, motion
+             blur only the one along the motion, which a plain Laplacian
+             would average away
+  clipped    share of pixels at either end of the histogram (blown-out or
+             black), where no text can be read
+Thresholds are tuned on the sample images with tune_quality.py.
+"""
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+Quality = namedtuple("Quality", "sharpness clipped")
+
+SCORE_WIDTH = 320
+CLIP_LOW = 5     # grey levels at or below count as black
+CLIP_HIGH = 250  # grey levels at or above count as blown out
+
+
+def grey(source, width=SCORE_WIDTH):
+    """Greyscale copy of source scaled down to width, as a float32 array."""
+    with Image.open(source) as img:
+        img.draft("L", (width, max(1, img.height * width // img.width)))
+        img = img.convert("L")
+
+    if img.width > width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.BILINEAR)
+    return np.asarray(img, dtype=np.float32)
+
+
+def score(source, width=SCORE_WIDTH):
+    pixels = grey(source, width)
+    dxx = pixels[:, :-2] + pixels[:, 2:] - 2 * pixels[:, 1:-1]
+    dyy = pixels[:-2, :] + pixels[2:, :] - 2 * pixels[1:-1, :]
+    clipped = np.count_nonzero((pixels <= CLIP_LOW) | (pixels >= CLIP_HIGH)) / pixels.size
+    return Quality(float(min(dxx.var(), dyy.var())), clipped)
+
+
+def usable(quality, min_sharpness, max_clipped):
+    return quality.sharpness >= min_sharpness and quality.clipped <= max_clipped
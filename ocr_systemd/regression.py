@@ -0,0 +1,179 @@
+"""
+Accuracy and latency regression check against the labeled sample images.
+
+image_folder/labels.csv holds the correct car and container code of every
+bundled frame. This runs the pipeline configuration given by the
+environment (backend, models, OCR_DET_*/OCR_CLS_* adaptive modes, quality
+gate, OCR_PARAMS_FILE, ...) over those frames the way a job treats a frame:
+quality gate, OCR, contrast-enhanced retry. It reports exact-match accuracy
+per code (spaces ignored), the false-read rate per code (a code read from a
+frame labeled without one, e.g. a container code on a plate frame), p50/p95
+latency per frame and peak RSS.
+
+--save writes the result as a baseline; --baseline compares against one and
+exits 1 if accuracy drops or false reads, latency or RSS grow beyond the
+thresholds. Run each configuration in its own process, since peak RSS
+covers the whole run.
+
+    python regression.py --save data/baseline.json
+    OCR_DET_ADAPTIVE=1 OCR_CLS_ADAPTIVE=1 python regression.py --baseline data/baseline.json
+    OCR_BACKEND=onnx python regression.py --baseline data/baseline.json --max-p95-increase 0
+"""
+import argparse
+import csv
+import json
+import statistics
+import time
+from pathlib import Path
+
+import memory
+import ocr as service
+import quality
+from reprocess import read_frame
+
+CODES = ("car_code", "container_code")
+
+
+def load_labels(path):
+    with open(path, newline="") as f:
+        return {row["image"]: (row["car_code"], row["container_code"]) for row in csv.DictReader(f)}
+
+
+def normalized(codes):
+    return tuple(code.replace(" ", "") for code in codes)
+
+
+def configuration():
+    """What decides accuracy and speed, for the report and the baseline file."""
+    config = {
+        "backend": service.OCR_BACKEND,
+        "model_dir": str(service.OCR_ONNX_DIR) if service.OCR_BACKEND == "onnx" else service.OCR_MODEL_DIR,
+        "device": service.OCR_DEVICE,
+        "precision": service.OCR_PRECISION,
+        "cpu_threads": service.OCR_CPU_THREADS,
+        "mkldnn": service.OCR_ENABLE_MKLDNN,
+        "det_adaptive": service.DET_ADAPTIVE and list(service.DET_LIMITS),
+        "cls_adaptive": service.CLS_ADAPTIVE,
+        "quality_gate": service.QUALITY_GATE and [service.QUALITY_MIN_SHARPNESS, service.QUALITY_MAX_CLIPPED],
+    }
+    if service.OCR_PARAMS_FILE.exists():
+        config["params"] = json.loads(service.OCR_PARAMS_FILE.read_text())
+    return config
+
+
+# --------------------- Run ---------------------
+def read(path):
+    """Codes a job would take from this frame."""
+    if service.QUALITY_GATE:
+        score = quality.score(path)
+        if not quality.usable(score, service.QUALITY_MIN_SHARPNESS, service.QUALITY_MAX_CLIPPED):
+            return "", ""
+    car, container, _ = read_frame(str(path))
+    return car, container
+
+
+def run(images, labels, rounds):
+    service.ocr = service.build_ocr()
+    read(images[0])  # warm-up
+
+    latencies, misses = [], []
+    correct = dict.fromkeys(CODES, 0)
+    false_reads = dict.fromkeys(CODES, 0)
+    for _ in range(rounds):
+        for image in images:
+            start = time.perf_counter()
+            codes = normalized(read(image))
+            latencies.append(time.perf_counter() - start)
+
+            expected = labels[image.name]
+            for name, got, want in zip(CODES, codes, expected):
+                if want and got == want:
+                    correct[name] += 1
+                elif want or got:
+                    misses.append((image.name, name, got, want))
+                    false_reads[name] += not want
+
+    totals = {name: rounds * sum(bool(label[i]) for label in labels.values()) for i, name in enumerate(CODES)}
+    unlabeled = {name: rounds * len(labels) - totals[name] for name in CODES}
+    latencies.sort()
+    return {
+        "config": configuration(),
+        "frames": len(images),
+        "rounds": rounds,
+        "accuracy": {name: 100 * correct[name] / totals[name] if totals[name] else 100.0 for name in CODES},
+        "false_reads": {name: 100 * false_reads[name] / unlabeled[name] if unlabeled[name] else 0.0
+                        for name in CODES},
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+        "peak_rss_mb": memory.peak_mb(),
+        "misses": sorted(set(misses)),
+    }
+
+
+def report(result):
+    print(json.dumps(result["config"]))
+    print(f"{result['frames']} frames x {result['rounds']} rounds")
+    for name in CODES:
+        print(f"  {name:<16}{result['accuracy'][name]:>7.1f} % exact, "
+              f"{result['false_reads'][name]:.1f} % false reads on frames without one")
+    print(f"  {'p50 / p95':<16}{result['p50_ms']:>7.1f} / {result['p95_ms']:.1f} ms per frame")
+    print(f"  {'peak RSS':<16}{result['peak_rss_mb']:>7.0f} MB")
+    for image, name, got, want in result["misses"]:
+        print(f"  miss {image}: {name} {got or '-'} (expected {want or 'none'})")
+
+
+# --------------------- Baseline ---------------------
+def regressions(result, baseline, args):
+    """Reasons this result is worse than the baseline beyond the thresholds."""
+    found = []
+    for name in CODES:
+        drop = baseline["accuracy"][name] - result["accuracy"][name]
+        if drop > args.max_accuracy_drop:
+            found.append(f"{name} accuracy {result['accuracy'][name]:.1f} % vs {baseline['accuracy'][name]:.1f} %")
+        if "false_reads" in baseline:  # not in baselines saved before false reads were counted
+            increase = result["false_reads"][name] - baseline["false_reads"][name]
+            if increase > args.max_false_read_increase:
+                found.append(f"{name} false reads {result['false_reads'][name]:.1f} % "
+                             f"vs {baseline['false_reads'][name]:.1f} %")
+
+    limits = (
+        ("p95_ms", args.max_p95_increase, "p95 latency", "ms"),
+        ("peak_rss_mb", args.max_rss_increase, "peak RSS", "MB"),
+    )
+    for key, increase, label, unit in limits:
+        if increase >= 0 and result[key] > baseline[key] * (1 + increase / 100):
+            found.append(f"{label} {result[key]:.0f} {unit} vs {baseline[key]:.0f} {unit} (+{increase:g} % allowed)")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=str(service.PROJ_DIR / "image_folder"))
+    parser.add_argument("--labels", help="CSV of image,car_code,container_code (default: labels.csv in --images)")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--save", help="write the result to this file, to be used as --baseline later")
+    parser.add_argument("--baseline", help="fail if the result regresses against this saved result")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0, help="percentage points, per code")
+    parser.add_argument("--max-false-read-increase", type=float, default=0, help="percentage points, per code")
+    parser.add_argument("--max-p95-increase", type=float, default=20, help="percent, negative = not checked")
+    parser.add_argument("--max-rss-increase", type=float, default=10, help="percent, negative = not checked")
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels or Path(args.images) / "labels.csv")
+    images = sorted(Path(args.images) / name for name in labels)
+    result = run(images, labels, args.rounds)
+    report(result)
+
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save).write_text(json.dumps(result, indent=2))
+    if args.baseline:
+        found = regressions(result, json.loads(Path(args.baseline).read_text()), args)
+        for reason in found:
+            print(f"REGRESSION: {reason}")
+        print("FAIL" if found else "PASS")
+        raise SystemExit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
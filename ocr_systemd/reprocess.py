@@ -0,0 +1,215 @@
+"""
+Offline reprocessing: re-run OCR over stored frames after a model or regex change.
+
+Walks --dir (recursively, with os.scandir), optionally only frames whose
+mtime falls in --since/--until, and OCRs every frame with the service's own
+extraction code (ocr_read, and the contrast-enhanced retry when nothing is
+found). The frames are sharded in batches over a pool of worker processes,
+each with its own engine, pinned to its share of the cores so the pool
+fills the machine without the engines fighting over threads.
+
+Results go to a separate database (--out, table reprocessed), one
+transaction per batch; a frame already in it is skipped, so an interrupted
+run (Ctrl-C, SIGTERM) picks up where it stopped when started again.
+--restart clears the table first.
+
+    python reprocess.py --dir /home/zzq/image_folder --since 2024-05-01 --until 2024-05-02
+    python reprocess.py --dir /mnt/archive --workers 8 --out data/reprocess_v2.db
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+import ocr as service
+
+BACKEND = service.OCR_BACKEND
+
+
+# --------------------- Frames ---------------------
+def walk(folder):
+    """Paths of all frames under folder, depth first."""
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path)
+            elif entry.name.lower().endswith(service.IMAGE_EXTS):
+                yield entry
+
+
+def select_frames(folder, since, until, done):
+    """(path, mtime) of the frames in the date range that are not in the output yet, oldest first."""
+    frames = []
+    for entry in walk(folder):
+        if entry.path in done:
+            continue
+        mtime = entry.stat().st_mtime
+        if since <= mtime < until:
+            frames.append((entry.path, mtime))
+    frames.sort(key=lambda frame: frame[1])
+    return frames
+
+
+def parse_time(value, default):
+    return datetime.fromisoformat(value).timestamp() if value else default
+
+
+# --------------------- Output ---------------------
+def open_output(path, restart):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reprocessed (
+            path TEXT PRIMARY KEY,
+            mtime TEXT NOT NULL,
+            camera TEXT NOT NULL,
+            car_code TEXT NOT NULL,
+            container_code TEXT NOT NULL,
+            ms REAL NOT NULL,
+            error TEXT,
+            backend TEXT NOT NULL,
+            processed TEXT NOT NULL
+        )
+    """)
+    if restart:
+        conn.execute("DELETE FROM reprocessed")
+    conn.commit()
+    return conn
+
+
+def write_batch(conn, results):
+    processed = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO reprocessed VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [result + (BACKEND, processed) for result in results],
+        )
+
+
+# --------------------- Workers ---------------------
+def init_worker(core_sets, threads):
+    # Ctrl-C reaches the whole process group; only the parent stops the run
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    cores = core_sets.get()
+    if cores:
+        os.sched_setaffinity(0, cores)  # before the engine starts its threads
+    service.OCR_CPU_THREADS = threads or len(cores or os.sched_getaffinity(0))
+    service.ocr = service.build_ocr()
+    # importing Paddle installs a crash dump on SIGTERM, which is how the pool stops its workers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def read_frame(path):
+    frame = service.load_frame(path)
+    if frame is None:
+        return "", "", "unreadable"
+
+    camera = service.camera_id(path)
+    car, container = service.ocr_read(frame, camera)
+    if not car and not container:
+        car, container = service.ocr_read(service.load_enhanced_frame(path), camera)
+    return car, container, None
+
+
+def ocr_batch(batch):
+    """Rows for the reprocessed table, without backend and processed time."""
+    results = []
+    for path, mtime in batch:
+        start = time.perf_counter()
+        try:
+            car, container, error = read_frame(path)
+        except Exception as e:
+            car, container, error = "", "", f"{type(e).__name__}: {e}"
+        results.append((
+            path,
+            datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S"),
+            service.camera_id(path),
+            car,
+            container,
+            (time.perf_counter() - start) * 1000,
+            error,
+        ))
+    return results
+
+
+def shard_cores(workers):
+    """Split the usable cores into one set per worker (None if there are fewer cores than workers)."""
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < workers:
+        return [None] * workers
+    per_worker = len(cores) // workers
+    return [set(cores[i * per_worker:(i + 1) * per_worker]) for i in range(workers)]
+
+
+# --------------------- Run ---------------------
+def run(args, conn, frames):
+    batches = [frames[i:i + args.batch] for i in range(0, len(frames), args.batch)]
+    core_sets = multiprocessing.Queue()
+    for cores in shard_cores(args.workers):
+        core_sets.put(cores)
+
+    done = read = errors = 0
+    start = time.monotonic()
+    last_report = start
+    pool = multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(core_sets, args.threads))
+    try:
+        for results in pool.imap_unordered(ocr_batch, batches):
+            write_batch(conn, results)
+            done += len(results)
+            read += sum(bool(car or container) for _, _, _, car, container, _, _ in results)
+            errors += sum(error is not None for *_, error in results)
+
+            now = time.monotonic()
+            if now - last_report >= args.report_every or done == len(frames):
+                last_report = now
+                rate = done / (now - start)
+                print(f"{done:>8}/{len(frames)}{rate:>10.2f} img/s{100 * read / done:>8.1f} % read"
+                      f"{errors:>7} errors   eta {(len(frames) - done) / rate / 60:.1f} min", flush=True)
+            if not service.RUNNING:  # SIGINT/SIGTERM, see ocr.shutdown_handler
+                print("Stopped, run again to resume")
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+
+    elapsed = time.monotonic() - start
+    return done, read, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=str(service.IMG_DIR), help="frames to reprocess, searched recursively")
+    parser.add_argument("--since", help="only frames written at or after this time, e.g. 2024-05-01 or '2024-05-01 06:00'")
+    parser.add_argument("--until", help="only frames written before this time")
+    parser.add_argument("--out", default=str(service.DB_FILE.parent / "reprocess.db"))
+    parser.add_argument("--restart", action="store_true", help="clear the output and start over")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes, one engine each")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="inference threads per worker (paddle backend), 0 = its share of the cores")
+    parser.add_argument("--batch", type=int, default=32, help="frames per batch (and per transaction)")
+    parser.add_argument("--report-every", type=float, default=10, help="seconds between progress lines")
+    args = parser.parse_args()
+    service.install_signal_handlers()  # Ctrl-C / SIGTERM stop after the current batch, see run()
+
+    conn = open_output(Path(args.out), args.restart)
+    done = {path for (path,) in conn.execute("SELECT path FROM reprocessed")}
+    frames = select_frames(args.dir, parse_time(args.since, 0), parse_time(args.until, float("inf")), done)
+    print(f"{len(frames)} frames to process ({len(done)} already in {args.out}), "
+          f"{args.workers} workers, {BACKEND} backend")
+    if not frames:
+        return
+
+    count, read, errors, elapsed = run(args, conn, frames)
+    conn.close()
+    print(f"\n{count} frames in {elapsed:.1f} s: {count / elapsed:.2f} images/s "
+          f"(including engine load), {read} with a code, {errors} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Soak test: run a live OCR service over the sample images for a long time and
+check that its memory stays bounded.
+
+The sample frames are copied into the service's IMG_DIR in rotation (as
+Top_soak.jpeg / "License Plate_soak.jpeg", replaced atomically) and one
+IMAGE_READY is sent per pair; the next pair goes in once the job shows up
+in the jobs table. Every job's RSS and heap stats come from that table,
+engine recycles from STATUS. The run fails if a job errors, RSS ever goes
+past --max-rss-mb, or RSS keeps growing (least-squares slope over the jobs
+after --warmup, in MB per 1000 jobs) faster than --max-growth.
+
+Frames whose speculative enhanced pass (OCR_SPECULATE) ran on an idle
+worker, used or discarded, are counted too; --min-speculated fails a run
+with fewer of them, to check that speculation actually happens.
+
+    python soak_test.py --img-dir /home/zzq/image_folder --jobs 5000 --max-rss-mb 3500
+    python soak_test.py --jobs 100 --warmup 10 --min-speculated 1   # service with OCR_SPECULATE=1 OCR_WORKERS=2
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import statistics
+import time
+from itertools import cycle
+from pathlib import Path
+
+PROJ_DIR = Path(__file__).resolve().parent
+CAMERAS = ("Top", "License Plate")
+
+
+# --------------------- Service ---------------------
+def trigger(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(b"IMAGE_READY\n")
+
+
+def query(path, command, timeout=5):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path)
+        client.sendall(command.encode() + b"\n")
+        return client.recv(1024).decode().strip()
+
+
+def status(path):
+    """STATUS reply as a dict, e.g. {"state": "ready", "recycles": "0", ...}."""
+    state, *fields = query(path, "STATUS").split()
+    return dict(field.split("=", 1) for field in fields if "=" in field) | {"state": state}
+
+
+def last_job(db):
+    conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT id, outcome, detail FROM jobs ORDER BY id DESC LIMIT 1").fetchone()
+    finally:
+        conn.close()
+
+
+def wait_for_job(db, after, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        row = last_job(db)
+        if row and row[0] > after:
+            return row
+        time.sleep(0.05)
+    return None
+
+
+# --------------------- Soak ---------------------
+def sample_pairs(images):
+    frames = {camera: sorted(Path(images).glob(f"{camera}_*.jpeg")) for camera in CAMERAS}
+    if not all(frames.values()):
+        raise SystemExit(f"need Top_*.jpeg and 'License Plate_*.jpeg' in {images}")
+    return zip(*(cycle(paths) for paths in frames.values()))
+
+
+def place(pair, img_dir):
+    for camera, src in zip(CAMERAS, pair):
+        tmp = img_dir / f".{camera}_soak.part"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, img_dir / f"{camera}_soak.jpeg")
+
+
+def run(args):
+    img_dir = Path(args.img_dir)
+    deadline = time.monotonic() + args.minutes * 60 if args.minutes else None
+    previous = last_job(args.db)
+    previous = previous[0] if previous else 0
+
+    samples, outcomes, speculative = [], {}, {}
+    start = time.monotonic()
+    print(f"{'jobs':>7}{'min':>7}{'rss MB':>9}{'heap MB':>9}{'free MB':>9}{'recycles':>10}{'read %':>8}")
+    for n, pair in enumerate(sample_pairs(args.images), 1):
+        if n > args.jobs or (deadline and time.monotonic() > deadline):
+            break
+
+        place(pair, img_dir)
+        trigger(args.socket)
+        row = wait_for_job(args.db, previous, args.timeout)
+        if row is None:
+            raise SystemExit(f"job {n}: nothing recorded within {args.timeout:.0f} s, is the service alive?")
+        previous, outcome, detail = row
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        detail = json.loads(detail)
+        mem = detail.get("memory", {})
+        samples.append(mem.get("rss_mb", 0.0))
+        for frame in detail.get("frames", {}).values():
+            if "speculative" in frame:
+                speculative[frame["speculative"]] = speculative.get(frame["speculative"], 0) + 1
+
+        if n % args.report_every == 0:
+            recycles = status(args.socket).get("recycles", "-")
+            print(f"{n:>7}{(time.monotonic() - start) / 60:>7.1f}{samples[-1]:>9.0f}"
+                  f"{mem.get('in_use_mb', 0):>9.0f}{mem.get('free_mb', 0):>9.0f}{recycles:>10}"
+                  f"{100 * outcomes.get('read', 0) / n:>8.1f}", flush=True)
+
+    return samples, outcomes, speculative
+
+
+def verdict(samples, outcomes, speculative, args):
+    measured = samples[args.warmup:]
+    if len(measured) < 2:
+        raise SystemExit(f"only {len(samples)} jobs, need more than --warmup {args.warmup}")
+
+    growth = statistics.linear_regression(range(len(measured)), measured).slope * 1000
+    peak = max(samples)
+    errors = outcomes.get("error", 0)
+    print(f"\n{len(samples)} jobs, outcomes {outcomes}")
+    print(f"RSS after warmup {measured[0]:.0f} MB, last {samples[-1]:.0f} MB, peak {peak:.0f} MB, "
+          f"growth {growth:+.1f} MB per 1000 jobs")
+
+    speculated = speculative.get("used", 0) + speculative.get("discarded", 0)
+    if speculative or args.min_speculated:
+        print(f"speculative enhanced passes {speculative}, {speculated} ran on an idle worker")
+
+    ok = (not errors and growth <= args.max_growth and (not args.max_rss_mb or peak <= args.max_rss_mb)
+          and speculated >= args.min_speculated)
+    print("PASS" if ok else "FAIL")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=os.getenv("IPC_SOCKET_PATH", "/home/zzq/ocr_tmp/ipc_image.sock"))
+    parser.add_argument("--db", default=os.getenv("DB_FILE", str(PROJ_DIR / "data/ocr_data.db")))
+    parser.add_argument("--img-dir", default=os.getenv("IMG_DIR", "/home/zzq/image_folder"),
+                        help="the service's IMG_DIR (single lane)")
+    parser.add_argument("--images", default=str(PROJ_DIR / "image_folder"), help="sample frames to rotate through")
+    parser.add_argument("--jobs", type=int, default=5000)
+    parser.add_argument("--minutes", type=float, default=0, help="stop after this long even if --jobs is not reached")
+    parser.add_argument("--warmup", type=int, default=50, help="jobs left out of the growth estimate")
+    parser.add_argument("--max-rss-mb", type=float, default=0, help="fail if RSS ever exceeds this (0 = no limit)")
+    parser.add_argument("--max-growth", type=float, default=20, help="fail above this many MB per 1000 jobs")
+    parser.add_argument("--report-every", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for each job")
+    parser.add_argument("--min-speculated", type=int, default=0,
+                        help="fail if fewer frames had a speculative enhanced pass run on an idle worker")
+    args = parser.parse_args()
+
+    raise SystemExit(0 if verdict(*run(args), args) else 1)
+
+
+if __name__ == "__main__":
+    main()
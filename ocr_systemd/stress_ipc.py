@@ -0,0 +1,154 @@
+"""
+Stress/fuzz test for the OCR service's trigger socket.
+
+Opens hundreds of misbehaving connections against a running service and
+checks that well-behaved clients are still answered promptly. STATUS is
+used as the probe: it goes through the same listener as IMAGE_READY, so
+its round-trip time is what a trigger waits before being queued.
+
+Misbehaving peers, mixed evenly:
+  idle       connect and never send
+  partial    send half a message ("IMAGE_REA") and stall
+  slowloris  trickle "STATUS" one byte every 0.5 s, never terminated
+  garbage    random bytes, some longer than the message limit
+  churn      connect and close immediately, repeatedly
+
+Also checks that a message split across several writes is reassembled.
+
+    python stress_ipc.py --socket /home/zzq/ocr_tmp/ipc_image.sock --peers 0,100,300,500
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+KINDS = ("idle", "partial", "slowloris", "garbage", "churn")
+
+
+# --------------------- Clients ---------------------
+async def query(path, payload, timeout):
+    """Send payload on a fresh connection and return the reply (b"" if none)."""
+    reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(path), timeout)
+    try:
+        for chunk, pause in payload:
+            writer.write(chunk)
+            await writer.drain()
+            if pause:
+                await asyncio.sleep(pause)
+        return await asyncio.wait_for(reader.readline(), timeout)
+    finally:
+        writer.close()
+
+
+async def probe(path, timeout):
+    start = time.perf_counter()
+    reply = await query(path, [(b"STATUS\n", 0)], timeout)
+    if not reply:
+        raise ConnectionError("no reply")
+    return (time.perf_counter() - start) * 1000
+
+
+async def misbehave(path, kind, stop):
+    writer = None
+    try:
+        if kind == "churn":
+            while not stop.is_set():
+                _, writer = await asyncio.open_unix_connection(path)
+                writer.close()
+                writer = None
+                await asyncio.sleep(0.05)
+            return
+
+        _, writer = await asyncio.open_unix_connection(path)
+        if kind == "partial":
+            writer.write(b"IMAGE_REA")
+        elif kind == "garbage":
+            writer.write(os.urandom(random.choice((16, 512, 2048))).replace(b"\n", b"."))
+        elif kind == "slowloris":
+            for byte in b"STATUS" * 100:
+                if stop.is_set():
+                    break
+                writer.write(bytes([byte]))
+                await writer.drain()
+                await asyncio.sleep(0.5)
+        await writer.drain()
+        await stop.wait()
+    except OSError:
+        pass  # the service is allowed to drop us
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# --------------------- Runs ---------------------
+async def run_phase(args, peers):
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(misbehave(args.socket, KINDS[i % len(KINDS)], stop)) for i in range(peers)]
+    await asyncio.sleep(args.settle)
+
+    latencies, errors = [], 0
+    for _ in range(args.probes):
+        try:
+            latencies.append(await probe(args.socket, args.timeout))
+        except (OSError, asyncio.TimeoutError):
+            errors += 1
+        await asyncio.sleep(args.interval)
+
+    stop.set()
+    await asyncio.gather(*tasks)
+    return latencies, errors
+
+
+async def split_message_ok(args):
+    """STATUS delivered in three writes must still be answered."""
+    payload = [(b"STA", 0.2), (b"TU", 0.2), (b"S\n", 0)]
+    try:
+        return bool(await query(args.socket, payload, args.timeout))
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+
+def report(peers, latencies, errors):
+    line = f"{peers:>7}{len(latencies):>8}{errors:>8}"
+    if latencies:
+        line += (f"{statistics.median(latencies):>9.1f}{sorted(latencies)[int(0.95 * (len(latencies) - 1))]:>9.1f}"
+                 f"{max(latencies):>9.1f}")
+    print(line, flush=True)
+
+
+async def main_async(args):
+    print(f"{'peers':>7}{'probes':>8}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    worst = 0.0
+    for peers in (int(p) for p in args.peers.split(",")):
+        latencies, errors = await run_phase(args, peers)
+        report(peers, latencies, errors)
+        if errors or not latencies:
+            worst = float("inf")
+        else:
+            worst = max(worst, max(latencies))
+
+    split_ok = await split_message_ok(args)
+    print(f"\nsplit message reassembled: {'yes' if split_ok else 'NO'}")
+    ok = split_ok and worst <= args.max_ms
+    print(f"worst probe {worst:.1f} ms (limit {args.max_ms:.0f} ms): {'PASS' if ok else 'FAIL'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=os.getenv("IPC_SOCKET_PATH", "/home/zzq/ocr_tmp/ipc_image.sock"))
+    parser.add_argument("--peers", default="0,100,300,500", help="comma-separated misbehaving connection counts")
+    parser.add_argument("--probes", type=int, default=50, help="STATUS round trips per phase")
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between probes")
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds to let the peers connect before probing")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--max-ms", type=float, default=250, help="fail if any probe takes longer")
+    args = parser.parse_args()
+
+    raise SystemExit(0 if asyncio.run(main_async(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
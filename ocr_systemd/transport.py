@@ -0,0 +1,62 @@
+"""
+Transports for the trigger socket and the result (retake) messages.
+
+An address is written as
+  unix:/path/to.sock   local Unix socket (systemd deployment); a bare path is read the same way
+  tcp:host:port        TCP, for the containers and triggers from other hosts
+Both speak the same newline-terminated messages, so the listener, the
+notifier and the clients do not care which one is configured.
+"""
+import os
+import socket
+from collections import namedtuple
+
+Address = namedtuple("Address", "family target")
+
+
+def parse(spec):
+    if spec.startswith("tcp:"):
+        host, _, port = spec[len("tcp:"):].rpartition(":")
+        return Address(socket.AF_INET, (host or "0.0.0.0", int(port)))
+    return Address(socket.AF_UNIX, spec[len("unix:"):] if spec.startswith("unix:") else spec)
+
+
+def describe(address):
+    if address.family == socket.AF_UNIX:
+        return f"unix:{address.target}"
+    return "tcp:%s:%d" % address.target
+
+
+def listen(address, backlog=128):
+    """Bound, listening, non-blocking server socket."""
+    if address.family == socket.AF_UNIX:
+        os.makedirs(os.path.dirname(address.target), exist_ok=True)
+        # a stale socket file from the last run would make bind() fail
+        if os.path.exists(address.target):
+            os.remove(address.target)
+
+    server = socket.socket(address.family, socket.SOCK_STREAM)
+    if address.family != socket.AF_UNIX:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(address.target)
+    server.listen(backlog)
+    server.setblocking(False)
+    if address.family == socket.AF_UNIX:
+        os.chmod(address.target, 0o666)  # allows all users R/W
+    return server
+
+
+def connect(address, timeout):
+    conn = socket.socket(address.family, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(address.target)
+    except OSError:
+        conn.close()
+        raise
+    return conn
+
+
+def cleanup(address):
+    if address.family == socket.AF_UNIX and os.path.exists(address.target):
+        os.remove(address.target)
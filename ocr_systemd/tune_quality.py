@@ -0,0 +1,132 @@
+"""
+Tune the quality gate thresholds (OCR_QUALITY_MIN_SHARPNESS, OCR_QUALITY_MAX_CLIPPED).
+
+Every sample image is degraded the ways real frames go bad (defocus, motion
+blur, over- and underexposure), re-encoded as JPEG like a camera would,
+scored with quality.py and OCRed with the service's own code: the raw pass
+and, when it finds nothing, the contrast-enhanced retry. A variant counts as
+read when either gives the same codes as the untouched image (ignoring
+spaces). The suggested thresholds keep every read variant (with --margin to
+spare) and show how many unreadable ones the gate would have saved an OCR
+pass on.
+
+    python tune_quality.py --images image_folder --backend onnx
+"""
+import argparse
+import io
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+import ocr as service
+import quality
+
+
+# --------------------- Degradations ---------------------
+def motion_blur(img, length):
+    """Horizontal motion blur over length pixels."""
+    pixels = np.asarray(img, dtype=np.float32)
+    padded = np.pad(pixels, ((0, 0), (length // 2, length - 1 - length // 2), (0, 0)), mode="edge")
+    summed = np.cumsum(padded, axis=1)
+    blurred = (summed[:, length - 1:] - np.concatenate([np.zeros_like(summed[:, :1]), summed[:, :-length]], axis=1)) / length
+    return Image.fromarray(np.clip(blurred, 0, 255).astype(np.uint8))
+
+
+def variants(img, args):
+    yield "original", img
+    for radius in args.blur:
+        yield f"blur {radius:g}", img.filter(ImageFilter.GaussianBlur(radius))
+    for length in args.motion:
+        yield f"motion {length}", motion_blur(img, length)
+    for gain in args.gain:
+        yield f"gain {gain:g}", ImageEnhance.Brightness(img).enhance(gain)
+
+
+def normalized(codes):
+    return tuple(code.replace(" ", "") for code in codes)
+
+
+def as_jpeg(img):
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=90)
+    buf.seek(0)
+    return buf
+
+
+# --------------------- Tuning ---------------------
+def run(args):
+    images = sorted(
+        p for p in Path(args.images).iterdir()
+        if p.name.lower().endswith(service.IMAGE_EXTS)
+    )
+    service.ocr = service.build_ocr(args.backend)
+
+    rows = []  # (image, variant, quality, read)
+    print(f"{'image':<24}{'variant':<12}{'sharpness':>10}{'clipped':>9}  codes")
+    for path in images:
+        with Image.open(path) as img:
+            img = img.convert("RGB")
+        camera = service.camera_id(path)
+
+        expected = None
+        for name, variant in variants(img, args):
+            data = as_jpeg(variant)
+            score = quality.score(data)
+            data.seek(0)
+            with Image.open(data) as decoded:
+                codes = normalized(service.ocr_read(service.to_ocr_input(decoded), camera))
+            if not any(codes):
+                data.seek(0)
+                codes = normalized(service.ocr_read(service.load_enhanced_frame(data), camera))
+
+            if expected is None:
+                expected = codes
+                if not any(codes):
+                    print(f"{path.name:<24}{'original':<12}{score.sharpness:>10.1f}{score.clipped:>9.3f}  "
+                          f"nothing read, skipped")
+                    break
+            read = codes == expected
+            rows.append((path.name, name, score, read))
+            print(f"{path.name:<24}{name:<12}{score.sharpness:>10.1f}{score.clipped:>9.3f}  "
+                  f"{'/'.join(c for c in codes if c) or '-'}{'' if read else '  (missed)'}", flush=True)
+
+    return rows
+
+
+def suggest(rows, margin):
+    read = [q for _, _, q, ok in rows if ok]
+    missed = [q for _, _, q, ok in rows if not ok]
+    if not read:
+        raise SystemExit("no variant was read, nothing to tune on")
+
+    min_sharpness = min(q.sharpness for q in read) * margin
+    max_clipped = min(1.0, max(q.clipped for q in read) / margin)
+    rejected = sum(not quality.usable(q, min_sharpness, max_clipped) for q in missed)
+    lost = sum(not quality.usable(q, min_sharpness, max_clipped) for q in read)
+
+    print(f"\n{len(read)} variants read, {len(missed)} missed")
+    print(f"OCR_QUALITY_MIN_SHARPNESS={min_sharpness:.0f}")
+    print(f"OCR_QUALITY_MAX_CLIPPED={max_clipped:.2f}")
+    print(f"these reject {rejected}/{len(missed)} unreadable variants and {lost}/{len(read)} readable ones")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=str(service.PROJ_DIR / "image_folder"))
+    parser.add_argument("--backend", default=service.OCR_BACKEND)
+    parser.add_argument("--blur", type=lambda s: [float(v) for v in s.split(",")], default="2,4,8",
+                        help="Gaussian blur radii in pixels")
+    parser.add_argument("--motion", type=lambda s: [int(v) for v in s.split(",")], default="15,40",
+                        help="horizontal motion blur lengths in pixels")
+    parser.add_argument("--gain", type=lambda s: [float(v) for v in s.split(",")], default="0.25,0.5,2,4",
+                        help="brightness gains (below 1 underexposure, above 1 overexposure)")
+    parser.add_argument("--margin", type=float, default=0.8,
+                        help="keep thresholds this much looser than the worst readable variant")
+    args = parser.parse_args()
+
+    suggest(run(args), args.margin)
+
+
+if __name__ == "__main__":
+    main()